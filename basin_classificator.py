@@ -0,0 +1,363 @@
+import abc
+import copy
+import heapq
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Optional
+
+from qgis.core import QgsFeedback
+
+from .classificator import Classificator
+from .models.feature import Feature
+from .models.feature_set import FeatureSet
+from .params import Params
+from .utils.message import Message
+from .utils.process_pool import poolContext
+from .utils.progress import Progress
+from .utils.spatial_index import GridIndex, bounds
+
+
+class BasinJob:
+    """Uma bacia: a drenagem contida em um polígono do limite."""
+
+    def __init__(
+        self,
+        basinId: int,
+        drainage: FeatureSet,
+        boundary: FeatureSet,
+        params: Params,
+    ) -> None:
+        self.basinId = basinId
+        self.drainage = drainage
+        self.boundary = boundary
+        self.params = params
+
+
+class BasinResult:
+    def __init__(self, basinId: int, result: int, job: BasinJob, log: Message):
+        self.basinId = basinId
+        self.result = result
+        # featureId, fluxo, Strahler, Shreve e observação de cada feição.
+        self.features = [
+            (f.featureId, f.flow, f.strahler, f.shreve, f.hasObservation)
+            for f in job.drainage.featuresList
+        ]
+        self.obs = [(item.featureId, item.text) for item in job.drainage.obs.list]
+        self.log = log.list
+        self.strahlerOrderType = job.params.strahlerOrderType
+
+
+def classifyBasin(job: BasinJob) -> BasinResult:
+    """Classifica uma bacia; roda em um processo do pool."""
+    log = Message(job.params)
+    result = Classificator(
+        job.drainage, job.boundary, job.params, log
+    ).classifyWaterBasin()
+    return BasinResult(job.basinId, result, job, log)
+
+
+def rings(feature: Feature) -> list[list[tuple[float, float]]]:
+    """
+    Anéis do polígono. Os vértices dos anéis vêm em sequência, e cada anel
+    termina ao voltar ao seu primeiro vértice.
+    """
+    result: list[list[tuple[float, float]]] = []
+    ring: list[tuple[float, float]] = []
+    for vertex in feature.vertexList:
+        point = (float(vertex.x), float(vertex.y))
+        ring.append(point)
+        if len(ring) > 3 and point == ring[0]:
+            result.append(ring)
+            ring = []
+    if len(ring) > 2:
+        result.append(ring + [ring[0]])
+    return result
+
+
+def contains(polygon: list[list[tuple[float, float]]], x: float, y: float) -> bool:
+    """Ponto no polígono pela regra par-ímpar (os furos também contam)."""
+    inside = False
+    for ring in polygon:
+        for (x1, y1), (x2, y2) in zip(ring, ring[1:]):
+            if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+                inside = not inside
+    return inside
+
+
+def samplePoint(feature: Feature) -> Optional[tuple[float, float]]:
+    """Ponto médio do segmento central: longe da foz, que toca o limite."""
+    if feature.segmentsList:
+        segment = feature.segmentsList[len(feature.segmentsList) // 2]
+        return (
+            (float(segment.a.x) + float(segment.b.x)) / 2,
+            (float(segment.a.y) + float(segment.b.y)) / 2,
+        )
+    if feature.vertexList:
+        return float(feature.vertexList[0].x), float(feature.vertexList[0].y)
+    return None
+
+
+class PartitionClassificator(Classificator, abc.ABC):
+    """
+    Classifica a drenagem em partes independentes, cada uma com o seu
+    próprio Classificator, em paralelo quando há mais de um processo. As
+    classificações voltam para a drenagem original. As subclasses definem
+    as partes em partition.
+    """
+
+    def __init__(
+        self,
+        drainage: FeatureSet,
+        boundary: FeatureSet,
+        params: Params,
+        log: Message,
+        feedback: Optional[QgsFeedback] = None,
+    ) -> None:
+        super().__init__(drainage, boundary, params, log, feedback)
+        self.workers = params.partitionWorkers or os.cpu_count() or 1
+
+    def classifyWaterBasin(self) -> int:
+        """
+        Códigos de retorno: os de Classificator.classifyWaterBasin. O erro
+        de uma parte (3 a 6) vale para o processamento; as feições de uma
+        parte sem foz não são processadas (alerta), a menos que nenhuma
+        parte tenha foz (2).
+        """
+        jobs, unassigned = self.partition()
+        if not jobs:
+            return 2
+
+        results = self.runJobs(jobs)
+        if results is None:
+            return 7
+
+        features = {
+            feature.featureId: feature
+            for feature in self.drainage.featuresList + self.drainage.newFeaturesList
+        }
+        result = 0
+        missingMouths = []
+        for basin in results:
+            self.mergeBasin(basin, features)
+            if basin.result == 2:
+                missingMouths.append(basin)
+            elif basin.result > 2 and result < 2:
+                result = basin.result
+            elif basin.result == 1 and result == 0:
+                result = 1
+
+        if len(missingMouths) == len(results):
+            return 2
+
+        # Feições fora das partes ou em partes sem foz não foram processadas.
+        if result < 2:
+            for basin in missingMouths:
+                self.reportMissingMouth(basin)
+                unassigned += [features[item[0]] for item in basin.features]
+            if self.evaluateProcessing(unassigned):
+                result = 1
+        return result
+
+    @abc.abstractmethod
+    def partition(self) -> tuple[list[BasinJob], list[Feature]]:
+        """As partes e as feições da drenagem que não entram em nenhuma."""
+
+    def reportMissingMouth(self, basin: "BasinResult") -> None:
+        pass
+
+    def createJob(
+        self,
+        jobId: int,
+        features: list[Feature],
+        polygons: Optional[list[Feature]] = None,
+    ) -> BasinJob:
+        """A parte com as feições e os polígonos do limite (padrão: todos)."""
+        if polygons is None:
+            polygons = [f for f in self.boundary.featuresList if f.vertexList]
+        # Cópia dos parâmetros sem o formulário, que não vai aos processos.
+        params = copy.copy(self.params)
+        params.origin = None
+        return BasinJob(
+            jobId,
+            self.drainage.subset(features),
+            self.boundary.subset(polygons),
+            params,
+        )
+
+    def runJobs(self, jobs: list[BasinJob]) -> Optional[list[BasinResult]]:
+        """Resultados na ordem das partes, ou None se a tarefa foi cancelada."""
+        self.progress = Progress(self.feedback, 20, 85, len(jobs), 1)
+        results: list[BasinResult] = []
+
+        if self.workers <= 1 or len(jobs) == 1:
+            for job in jobs:
+                results.append(classifyBasin(job))
+                if self.progress.step():
+                    return None
+            return results
+
+        with ProcessPoolExecutor(
+            max_workers=min(self.workers, len(jobs)), mp_context=poolContext()
+        ) as pool:
+            futures = [pool.submit(classifyBasin, job) for job in jobs]
+            for future in as_completed(futures):
+                results.append(future.result())
+                if self.progress.step():
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    return None
+
+        results.sort(key=lambda basin: basin.basinId)
+        return results
+
+    def mergeBasin(self, basin: BasinResult, features: dict[int, Feature]) -> None:
+        for featureId, flow, strahler, shreve, hasObservation in basin.features:
+            feature = features.get(featureId)
+            if feature:
+                feature.flow = flow
+                feature.strahler = strahler
+                feature.shreve = shreve
+                feature.hasObservation = hasObservation
+
+        for featureId, text in basin.obs:
+            self.drainage.obs.set_value(featureId, text)
+        self.log.list.extend(basin.log)
+
+        # Mais de dois afluentes em uma parte: Strahler relaxado.
+        self.params.strahlerOrderType = max(
+            self.params.strahlerOrderType, basin.strahlerOrderType
+        )
+
+
+class BasinClassificator(PartitionClassificator):
+    """
+    Classifica cada polígono do limite como uma bacia independente. A
+    drenagem é repartida pelo polígono que contém cada feição, gravado em
+    Feature.basinId.
+    """
+
+    def partition(self) -> tuple[list[BasinJob], list[Feature]]:
+        """
+        Associa cada feição da drenagem ao primeiro polígono do limite que
+        contém o seu ponto de amostra. Os polígonos são encontrados por um
+        índice espacial dos seus retângulos envolventes.
+        """
+        polygons = [f for f in self.boundary.featuresList if f.vertexList]
+        boxes = [bounds((v.x, v.y) for v in f.vertexList) for f in polygons]
+        cellSize = sum(max(box[2] - box[0], box[3] - box[1]) for box in boxes) / max(
+            len(boxes), 1
+        )
+        index = GridIndex(cellSize)
+        for i, box in enumerate(boxes):
+            index.insert(i, box)
+        polygonRings = [rings(f) for f in polygons]
+
+        members: list[list[Feature]] = [[] for _ in polygons]
+        unassigned: list[Feature] = []
+        for feature in self.drainage.featuresList + self.drainage.newFeaturesList:
+            point = samplePoint(feature)
+            owner = None
+            if point is not None:
+                for i in index.queryPoint(*point):
+                    if contains(polygonRings[i], *point):
+                        owner = i
+                        break
+            if owner is None:
+                unassigned.append(feature)
+            else:
+                members[owner].append(feature)
+
+        jobs = []
+        for polygon, features in zip(polygons, members):
+            if not features:  # Polígono sem drenagem.
+                continue
+            basinId = polygon.featureId + 1
+            for feature in features:
+                feature.basinId = basinId
+            jobs.append(self.createJob(basinId, features, [polygon]))
+        return jobs, unassigned
+
+    def reportMissingMouth(self, basin: "BasinResult") -> None:
+        self.log.append(f"Aviso: foz não identificada na bacia {basin.basinId}.")
+
+
+class ComponentClassificator(PartitionClassificator):
+    """
+    Separa a drenagem em componentes conexas antes da varredura: redes que
+    não se tocam não precisam estar na mesma linha de varredura. Cada
+    grupo de componentes é varrido com o limite inteiro.
+    """
+
+    def partition(self) -> tuple[list[BasinJob], list[Feature]]:
+        features = self.drainage.featuresList + self.drainage.newFeaturesList
+        parent = list(range(len(features)))
+
+        def find(i: int) -> int:
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        def union(i: int, j: int) -> None:
+            i, j = find(i), find(j)
+            if i != j:
+                parent[max(i, j)] = min(i, j)
+
+        # Extremidades iguais (na célula da tolerância): confluências.
+        tolerance = float(self.geo.tolerance)
+        ends: dict[tuple[Any, Any], int] = {}
+        for i, feature in enumerate(features):
+            for vertex in feature.vertexList[:1] + feature.vertexList[-1:]:
+                key: tuple[Any, Any] = (vertex.x, vertex.y)
+                if tolerance > 0:
+                    key = (
+                        round(float(vertex.x) / tolerance),
+                        round(float(vertex.y) / tolerance),
+                    )
+                union(i, ends.setdefault(key, i))
+
+        # Retângulos envolventes que se tocam: possíveis cruzamentos, toques
+        # fora das extremidades e extremidades em células vizinhas.
+        boxes = [
+            bounds((v.x, v.y) for v in f.vertexList) if f.vertexList else None
+            for f in features
+        ]
+        sizes = [max(b[2] - b[0], b[3] - b[1]) for b in boxes if b]
+        index = GridIndex(sum(sizes) / max(len(sizes), 1))
+        for i, box in enumerate(boxes):
+            if box:
+                box = (
+                    box[0] - tolerance,
+                    box[1] - tolerance,
+                    box[2] + tolerance,
+                    box[3] + tolerance,
+                )
+                for j in index.query(box):
+                    union(i, j)
+                index.insert(i, box)
+
+        components: dict[int, list[Feature]] = {}
+        for i, feature in enumerate(features):
+            components.setdefault(find(i), []).append(feature)
+
+        # Componentes agrupadas em poucas partes de tamanho parecido: cada
+        # parte repete os segmentos do limite.
+        groups: list[list[Feature]] = [
+            [] for _ in range(min(len(components), self.workers * 4))
+        ]
+        load = [(0, i) for i in range(len(groups))]
+        for component in sorted(
+            components.values(),
+            key=lambda c: sum(len(f.segmentsList) for f in c),
+            reverse=True,
+        ):
+            size, i = heapq.heappop(load)
+            groups[i] += component
+            heapq.heappush(
+                load, (size + sum(len(f.segmentsList) for f in component), i)
+            )
+
+        jobs = [
+            self.createJob(i + 1, sorted(group, key=lambda f: f.featureId))
+            for i, group in enumerate(groups)
+        ]
+        return jobs, []
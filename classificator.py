@@ -1,16 +1,81 @@
+import copy
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from decimal import Decimal
-from typing import Optional
+from typing import Any, Optional
 
+from qgis.core import QgsFeedback
+
+from .models.feature import Feature
 from .models.feature_set import FeatureSet
 from .models.node import Node
-from .models.position import Position
+from .models.position import Position, PositionNode
 from .models.relation import Relation
 from .models.segment import Segment
 from .models.vertex import Vertex
 from .params import Params
-from .utils.geometry import Geometry
+from .utils.geometry import FloatGeometry, Geometry, GridGeometry
 from .utils.message import Message
-from .utils.scanner import ScanLine, Scanner
+from .utils.grid_scanner import GridScanner, numpyAvailable
+from .utils.pair_scanner import PairScanner
+from .utils.process_pool import poolContext
+from .utils.progress import Progress
+from .utils.scanner import ScanLine, Scanner, ScanVertex
+
+
+class NodeFrame:
+    """Nó em construção na pilha de Classificator.createNodes."""
+
+    __slots__ = ("segment", "node", "childSegments", "nextChild")
+
+    def __init__(
+        self, segment: Segment, node: Node, childSegments: list[Segment]
+    ) -> None:
+        self.segment = segment
+        self.node = node
+        self.childSegments = childSegments
+        self.nextChild = 0
+
+
+SegmentKey = tuple[int, int, int]  # setId, featureId, segmentId
+
+
+class SlabJob:
+    """Uma faixa vertical do plano e os segmentos que a alcançam."""
+
+    def __init__(
+        self,
+        drainage: FeatureSet,
+        boundary: FeatureSet,
+        params: Params,
+        slab: tuple[Any, Any],
+    ) -> None:
+        self.drainage = drainage
+        self.boundary = boundary
+        self.params = params
+        self.slab = slab
+
+
+def sweepSlab(job: SlabJob) -> list[tuple[SegmentKey, SegmentKey, int]]:
+    """
+    Varre uma faixa; roda em um processo do pool. Retorna as chamadas de
+    Relation.addRelation da faixa, na ordem da varredura.
+    """
+    classificator = Classificator(
+        job.drainage, job.boundary, job.params, Message(job.params)
+    )
+    classificator.slab = job.slab
+    classificator.topologicalRelations.history = []
+    classificator.buildScanner()
+    classificator.scanPlane()
+    return [
+        (
+            (a.setId, a.featureId, a.segmentId),
+            (b.setId, b.featureId, b.segmentId),
+            relationType,
+        )
+        for a, b, relationType in classificator.topologicalRelations.history
+    ]
 
 
 class Classificator:
@@ -20,15 +85,32 @@ class Classificator:
         boundary: FeatureSet,
         params: Params,
         log: Message,
+        feedback: Optional[QgsFeedback] = None,
     ) -> None:
         self.drainage = drainage
         self.boundary = boundary
         self.params = params
-        self.geo = Geometry(params.toleranceXY)
-        self.scanner = Scanner(self.geo)
+        self.geo: Geometry
+        if params.snapToGridEnabled:
+            self.geo = GridGeometry()
+        elif params.floatGeometryEnabled:
+            self.geo = FloatGeometry(params.toleranceXY)
+        else:
+            self.geo = Geometry(params.toleranceXY)
+        self.scanner = Scanner(
+            self.geo,
+            params.heapQueueEnabled,
+            params.eventMergeEnabled,
+            params.monotoneChainsEnabled,
+        )
         self.topologicalRelations = Relation(log)
         self.position = Position(self.geo, log)
         self.log = log
+        self.feedback = feedback
+        self.progress = Progress(feedback)
+        # Faixa [início, fim) cujas relações esta varredura registra (None -
+        # sem limite).
+        self.slab: Optional[tuple[Any, Any]] = None
 
     def classifyWaterBasin(self) -> int:
         """
@@ -39,18 +121,30 @@ class Classificator:
         3 - Mais de uma foz identificada.
         4 - Feição com mais de dois afluentes.
         5 - Relações topológicas inesperadas! (listado no log)
+        7 - Processamento cancelado.
         """
         result = 0
 
-        # Montando a linha de varredura.
-        self.buildScanner()
+        if self.params.topologyEngine in (1, 2):
+            # Relações a partir dos pares candidatos de um índice espacial.
+            self.scanPairs()
+        elif self.params.sweepSlabs > 1:
+            # Varrendo o plano em faixas verticais, em paralelo.
+            self.scanSlabs()
+        else:
+            # Montando a linha de varredura.
+            self.buildScanner()
+            if self.progress.isCanceled():
+                return 7
 
-        # Varrendo o plano;
-        self.scanPlane()
+            # Varrendo o plano;
+            self.scanPlane()
+        if self.progress.isCanceled():
+            return 7
 
         # Verificando a existência de relações topológicas inesperadas
         # (toque e interseção).
-        if self.topologicalRelations.err:
+        if self.topologicalRelations.errors:
             # Listando os eventos estranhos.
             self.topologicalRelations.reportUnexpectedRelations(self.log)
             result = 5
@@ -70,6 +164,7 @@ class Classificator:
         self.scanner.sortLines()
 
     def scanPlane(self) -> None:
+        self.progress = Progress(self.feedback, 20, 70, self.scanner.eventCount)
         scanLine = self.scanner.next()
         if scanLine:
             previousCoord = scanLine.vertex.x
@@ -82,6 +177,11 @@ class Classificator:
                 self.processScanPoints(previousCoord)
                 previousCoord = scanLineCoord
 
+                # Fim da faixa: o restante é da faixa seguinte.
+                if self.slab and self.slab[1] is not None:
+                    if not self.geo.smallerThan(scanLineCoord, self.slab[1]):
+                        break
+
             # Inserir segmento(s) no ponto de varredura.
             self.scanner.addScanPoint(scanLine)
 
@@ -89,31 +189,32 @@ class Classificator:
             if scanLine.eventType == 0:  # Extremo esquerdo. Segmento entrando.
                 # Inserindo em posição.
                 index_A = self.position.insert(scanLine.segmentA)
+                self.evaluateNeighbours(scanLineVertex, index_A, scanLine.segmentA)
 
-                # Verificando segmento imediatamente acima.
-                above = self.position.above(index_A)
-                if above:  # Se há segmento acima:
-                    self.evaluateSegments(scanLineVertex, above, scanLine.segmentA)
-
-                # Verificando segmento imediatamente abaixo.
-                below = self.position.below(index_A)
-                if below:  # Se há segmento abaixo:
-                    self.evaluateSegments(scanLineVertex, scanLine.segmentA, below)
+            elif scanLine.eventType == 1 and scanLine.segmentB:
+                # Vértice interno de uma cadeia monótona: o segmento seguinte
+                # toma o lugar do que termina, sem nova busca em Posicao.
+                index_A = self.position.locate(scanLineCoord, scanLine.segmentA)
+                if index_A is not None and self.position.fits(
+                    index_A, scanLine.segmentB
+                ):
+                    self.position.replace(index_A, scanLine.segmentB)
+                    self.evaluateNeighbours(
+                        scanLineVertex, index_A, scanLine.segmentB
+                    )
+                else:
+                    # Outros segmentos no vértice mudam a ordem: como nos dois
+                    # eventos da varredura sem cadeias.
+                    index_B = self.position.insert(scanLine.segmentB)
+                    self.evaluateNeighbours(
+                        scanLineVertex, index_B, scanLine.segmentB
+                    )
+                    self.removeSegment(scanLineVertex, index_A)
 
             elif scanLine.eventType == 1:
                 # Localizando o segmento em Posicao.
                 index_A = self.position.locate(scanLineCoord, scanLine.segmentA)
-
-                # Verificando segmento imediatamente acima.
-                above = self.position.above(index_A)
-                if above:
-                    # Verificando segmento imediatamente abaixo.
-                    below = self.position.below(index_A)
-                    if below:
-                        self.evaluateSegments(scanLineVertex, above, below)
-
-                # Excluindo de posição.
-                self.position.delete(index_A)
+                self.removeSegment(scanLineVertex, index_A)
 
             elif scanLine.eventType == 2 and scanLine.segmentB:  # Interseção.
                 # Separando interseção por toque.
@@ -151,10 +252,174 @@ class Classificator:
                             scanLineVertex, scanLine.segmentA, below
                         )
 
+            if self.progress.step():  # Tarefa cancelada.
+                return
+
             scanLine = self.scanner.next()
 
         # Processando os pontos da ultima linha de varredura.
         self.processScanPoints(previousCoord)
+        self.progress.finish()
+
+    def evaluateNeighbours(
+        self, vertex: Vertex, node: Optional[PositionNode], segment: Segment
+    ) -> None:
+        """Testa o segmento que entrou em node contra os seus vizinhos."""
+        # Verificando segmento imediatamente acima.
+        above = self.position.above(node)
+        if above:  # Se há segmento acima:
+            self.evaluateSegments(vertex, above, segment)
+
+        # Verificando segmento imediatamente abaixo.
+        below = self.position.below(node)
+        if below:  # Se há segmento abaixo:
+            self.evaluateSegments(vertex, segment, below)
+
+    def removeSegment(self, vertex: Vertex, node: Optional[PositionNode]) -> None:
+        """Exclui o segmento de node, testando os vizinhos que se encontram."""
+        # Verificando segmento imediatamente acima.
+        above = self.position.above(node)
+        if above:
+            # Verificando segmento imediatamente abaixo.
+            below = self.position.below(node)
+            if below:
+                self.evaluateSegments(vertex, above, below)
+
+        # Excluindo de posição.
+        self.position.delete(node)
+
+    def scanSlabs(self) -> None:
+        """
+        Divide o plano em sweepSlabs faixas verticais com números de eventos
+        parecidos e varre cada faixa em um processo. Os segmentos que
+        alcançam uma faixa são repetidos nela, inteiros; cada faixa só
+        registra as relações dos seus pontos de varredura, que voltam para
+        topologicalRelations na ordem da varredura única.
+        """
+        features = [
+            f
+            for f in self.drainage.featuresList
+            + self.drainage.newFeaturesList
+            + self.boundary.featuresList
+            if f.process
+        ]
+        xs = sorted(
+            vertex.x
+            for feature in features
+            for segment in feature.segmentsList
+            for vertex in (segment.a, segment.b)
+        )
+
+        # Cortes entre eventos mais distantes que a tolerância, para não
+        # separar os pontos de uma mesma linha de varredura.
+        slabs = max(self.params.sweepSlabs, 1)
+        cuts: list[Any] = []
+        for k in range(1, slabs):
+            i = max(k * len(xs) // slabs, 1)
+            while i < len(xs) and not self.geo.smallerThan(xs[i - 1], xs[i]):
+                i += 1
+            if i < len(xs) and (not cuts or cuts[-1] < xs[i]):
+                cuts.append(xs[i])
+        limits = [None, *cuts, None]
+
+        # Cópia dos parâmetros sem o formulário, que não vai aos processos.
+        params = copy.copy(self.params)
+        params.origin = None
+        params.sweepSlabs = 0
+
+        jobs = []
+        for start, end in zip(limits, limits[1:]):
+            # Segmentos que alcançam a faixa, com a tolerância.
+            def keep(segment: Segment, start: Any = start, end: Any = end) -> bool:
+                low = min(segment.a.x, segment.b.x)
+                high = max(segment.a.x, segment.b.x)
+                return (start is None or not self.geo.smallerThan(high, start)) and (
+                    end is None or not self.geo.smallerThan(end, low)
+                )
+
+            jobs.append(
+                SlabJob(
+                    self.drainage.subset(
+                        [f for f in features if f.setId == 0], keep
+                    ),
+                    self.boundary.subset(
+                        [f for f in features if f.setId == 1], keep
+                    ),
+                    params,
+                    (start, end),
+                )
+            )
+
+        results = self.runSlabs(jobs)
+        if results is None:  # Tarefa cancelada.
+            return
+
+        segments = {
+            (segment.setId, segment.featureId, segment.segmentId): segment
+            for feature in features
+            for segment in feature.segmentsList
+        }
+        for history in results:
+            for a, b, relationType in history:
+                self.topologicalRelations.addRelation(
+                    segments[a], segments[b], relationType
+                )
+
+    def scanPairs(self) -> None:
+        segments = [
+            segment
+            for feature in self.drainage.featuresList
+            + self.drainage.newFeaturesList
+            + self.boundary.featuresList
+            if feature.process
+            for segment in feature.segmentsList
+        ]
+        scanner: PairScanner
+        if self.params.topologyEngine == 2 and numpyAvailable():
+            scanner = GridScanner(self.geo, segments)
+        else:
+            if self.params.topologyEngine == 2:
+                self.log.append("Aviso: NumPy indisponível; usando a R-tree.")
+            scanner = PairScanner(
+                self.geo,
+                segments,
+                self.params.partitionWorkers or os.cpu_count() or 1,
+            )
+        points = scanner.scanPoints()
+
+        self.progress = Progress(self.feedback, 20, 70, len(points))
+        for scanVertex in points:
+            self.evaluateScanPoint(scanVertex)
+            if self.progress.step():  # Tarefa cancelada.
+                return
+        self.progress.finish()
+
+    def runSlabs(
+        self, jobs: list[SlabJob]
+    ) -> Optional[list[list[tuple[SegmentKey, SegmentKey, int]]]]:
+        """Resultados na ordem das faixas, ou None se a tarefa foi cancelada."""
+        self.progress = Progress(self.feedback, 20, 70, len(jobs), 1)
+        workers = self.params.partitionWorkers or os.cpu_count() or 1
+
+        if workers <= 1 or len(jobs) == 1:
+            results = []
+            for job in jobs:
+                results.append(sweepSlab(job))
+                if self.progress.step():
+                    return None
+            return results
+
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(jobs)), mp_context=poolContext()
+        ) as pool:
+            futures = {pool.submit(sweepSlab, job): i for i, job in enumerate(jobs)}
+            done: dict[int, list[tuple[SegmentKey, SegmentKey, int]]] = {}
+            for future in as_completed(futures):
+                done[futures[future]] = future.result()
+                if self.progress.step():
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    return None
+        return [done[i] for i in range(len(jobs))]
 
     def evaluateSegments(
         self, vertex: Vertex, above: Segment, below: Segment
@@ -201,52 +466,61 @@ class Classificator:
                     )
 
     def processScanPoints(self, scanLine: Decimal) -> None:
-        test = []
+        # Varredura por faixas: os pontos fora da faixa são só descartados,
+        # as suas relações são registradas pela faixa vizinha.
+        inSlab = True
+        if self.slab is not None:
+            start, end = self.slab
+            inSlab = (
+                start is None or not self.geo.smallerThan(scanLine, start)
+            ) and (end is None or self.geo.smallerThan(scanLine, end))
 
         # Obtendo o primeiro ponto de varradura.
         scanVertex = self.scanner.nextInLine(scanLine)
         while scanVertex is not None:
-            if len(scanVertex.segments) > 1:  # Há relações topológicas.
-                # Testando os segmentos.
-                for segment in scanVertex.segments:
-                    test.append(
-                        (
-                            self.geo.equalsTo(scanVertex.vertex, segment.a)
-                            and (segment.a.isExtremity() or segment.setId == 1)
-                        )
-                        or (
-                            self.geo.equalsTo(scanVertex.vertex, segment.b)
-                            and (segment.b.isExtremity() or segment.setId == 1)
-                        )
-                    )
-
-                # Avaliando as relações topológicas.
-                for i in range(len(scanVertex.segments) - 1):
-                    j = i + 1
-
-                    if test[i] and test[j]:  # Encosta.
-                        self.topologicalRelations.addRelation(
-                            scanVertex.segments[i],
-                            scanVertex.segments[j],
-                            0,
-                        )
-                    elif test[i] or test[j]:  # Toca.
-                        self.topologicalRelations.addRelation(
-                            scanVertex.segments[i],
-                            scanVertex.segments[j],
-                            1,
-                        )
-                    else:  # Intercepta.
-                        self.topologicalRelations.addRelation(
-                            scanVertex.segments[i],
-                            scanVertex.segments[j],
-                            2,
-                        )
-
-                test.clear()
+            # Há relações topológicas (na faixa).
+            if inSlab and len(scanVertex.segments) > 1:
+                self.evaluateScanPoint(scanVertex)
 
             scanVertex = self.scanner.nextInLine(scanLine)
 
+    def evaluateScanPoint(self, scanVertex: ScanVertex) -> None:
+        # Testando os segmentos.
+        test = [
+            (
+                self.geo.equalsTo(scanVertex.vertex, segment.a)
+                and (segment.a.isExtremity() or segment.setId == 1)
+            )
+            or (
+                self.geo.equalsTo(scanVertex.vertex, segment.b)
+                and (segment.b.isExtremity() or segment.setId == 1)
+            )
+            for segment in scanVertex.segments
+        ]
+
+        # Avaliando as relações topológicas.
+        for i in range(len(scanVertex.segments) - 1):
+            j = i + 1
+
+            if test[i] and test[j]:  # Encosta.
+                self.topologicalRelations.addRelation(
+                    scanVertex.segments[i],
+                    scanVertex.segments[j],
+                    0,
+                )
+            elif test[i] or test[j]:  # Toca.
+                self.topologicalRelations.addRelation(
+                    scanVertex.segments[i],
+                    scanVertex.segments[j],
+                    1,
+                )
+            else:  # Intercepta.
+                self.topologicalRelations.addRelation(
+                    scanVertex.segments[i],
+                    scanVertex.segments[j],
+                    2,
+                )
+
     def buildTree(self) -> int:
         """
         Valores de retorno:
@@ -256,13 +530,14 @@ class Classificator:
         4 - nó com mais de dois filhos
         5 - nó em loop
         6 - bacias interconectadas
+        7 - processamento cancelado
         """
         result = 0
+        self.progress = Progress(
+            self.feedback, 70, 85, len(self.drainage.featuresList), 100
+        )
 
         if self.topologicalRelations.mouths:
-            # Montando os índices dos eventos.
-            self.topologicalRelations.buildIndexes()
-
             # Construindo a árvore que representa cada bacia.
             for mouthRelation in self.topologicalRelations.mouths:
                 # origem: segmento da foz; destino: segmento do limite.
@@ -275,6 +550,7 @@ class Classificator:
         else:
             result = 2  # Foz não identificada!!!
 
+        self.progress.finish()
         return result
 
     def createNodes(
@@ -285,151 +561,173 @@ class Classificator:
         result: int,
     ) -> tuple[int, Optional[Node]]:
         """
+        Percorre a árvore em pós-ordem com uma pilha explícita, para que rios
+        longos não estourem o limite de recursão.
         Valores para resultado:
         0 - processamento sem erros
         4 - nó com mais de dois filhos
         5 - nó em loop
         6 - bacias interconectadas
+        7 - processamento cancelado
         """
-        node = None
+        if result != 0:
+            return result, None
 
-        if result == 0:
-            # Verificando a condição de interconexão entre árvores.
-            loopBasin = False
-            basinConnection = False
-            feature = self.drainage.getFeature(segment.featureId)
+        result, frame = self._openNode(segment, destination, sibling_nodes)
+        if not frame:
+            return result, None
 
-            if not feature:
-                return 0, None
+        stack = [frame]
+        while stack:
+            frame = stack[-1]
 
-            if segment.isMouth:
-                # A feição corrente é a feição da foz e o segmento pai é do
-                # limite da bacia. É o início do processamento de uma bacia!
+            # Descendo para o próximo filho.
+            if result == 0 and frame.nextChild < len(frame.childSegments):
+                child = frame.childSegments[frame.nextChild]
+                frame.nextChild += 1
 
-                # Verificando se a feição da foz já foi processada.
-                if feature.mouthFeatureId < 0:
-                    # Árvore ainda não processada.
-                    feature.mouthFeatureId = feature.featureId
-                else:
-                    # Árvore já processada. Existe interconexão entre bacias!
-                    basinConnection = True
-            else:
-                destFeature = self.drainage.getFeature(destination.featureId)
-                if destFeature and feature.mouthFeatureId < 0:
-                    feature.mouthFeatureId = destFeature.featureId
-                else:
-                    # Feição já processada! Loop!
-                    loopBasin = True
-
-            # Verificando a condição de loop na árvore ou interconexão entre árvores.
-            if not loopBasin and not basinConnection:
-                node = Node(segment.featureId)
-
-                # Processando o fluxo.
-                if len(feature.segmentsList) > 1:  # Vários segmentos.
-                    if segment.segmentId == 0:
-                        node.flow = 2  # Inverter!
-                    else:
-                        node.flow = 1  # Manter!
-                else:  # Segmento único.
-                    # Verificando se o vértice "a" do segmento encosta no pai.
-                    if segment.a.equalsTo(destination.a) or segment.a.equalsTo(
-                        destination.b
-                    ):
-                        # TODO Maybe we should also invert the vertexes here?
-                        # TODO Maybe we should invert the segments here?
-                        if segment.a.vertexId == 0:
-                            node.flow = 2  # Inverter!
-                        else:
-                            node.flow = 1  # Manter!
-                    else:  # Então é o vértice "b" que encosta no pai.
-                        if segment.b.vertexId == 0:
-                            node.flow = 2  # Inverter!
-                        else:
-                            node.flow = 1  # Manter!
-
-                # Obtendo os filhos.
-                childSegments = self.topologicalRelations.findChildSegments(
-                    segment.featureId,
-                    -1 if destination.setId == 1 else destination.featureId,
-                    sibling_nodes,
+                result, childFrame = self._openNode(
+                    child, frame.segment, frame.childSegments
+                )
+                if childFrame:
+                    stack.append(childFrame)
+                continue
+
+            # Todos os filhos processados. Gravando classificação.
+            stack.pop()
+            node = frame.node
+            if result == 0 and self.progress.step():  # Tarefa cancelada.
+                result = 7
+            if result == 0:
+                self.drainage.setFeatureClassification(
+                    featureId=node.featureId,
+                    flow=node.flow,
+                    strahler=node.strahler,
+                    shreve=node.shreve,
                 )
 
-                # Classificando o nó.
-                childNode = None
+            if not stack:
+                return result, node
 
-                # Instanciar o nó com valor inicial 1 para Strahler e Shreve
-                # para eliminar a necessidade de definit os valores para os nós.
-                # Não será necessário avaliar (filhosSegmento.size() == 0).
-                if not childSegments:  # Nó sem filhos. É folha!
-                    # Classificando por Strahler
+            # Subindo para o pai.
+            parent = stack[-1]
+            if result == 0:
+                # As regras para a classificação por Strahler e Shreve
+                # estão no método No::inserirFilhoNo().
+                parent.node.addChild(node)
+
+                if len(parent.childSegments) == 1:  # Apenas um filho.
                     if self.params.strahlerOrderType > 0:
-                        node.strahler = 1
-                    # Classificando por Shreve.
+                        parent.node.strahler = node.strahler
+
                     if self.params.shreveOrderEnabled:
-                        node.shreve = 1
+                        parent.node.shreve = node.shreve
 
-                elif len(childSegments) == 1:
-                    # Apenas um filho.
-                    result, childNode = self.createNodes(
-                        childSegments[0], segment, childSegments, result
-                    )
-                    if result == 0 and childNode:
-                        node.addChild(childNode)
+        return result, None
 
-                        if self.params.strahlerOrderType > 0:
-                            node.strahler = childNode.strahler
+    def _openNode(
+        self,
+        segment: Segment,
+        destination: Segment,
+        sibling_nodes: list[Segment],
+    ) -> tuple[int, Optional["NodeFrame"]]:
+        # Verificando a condição de interconexão entre árvores.
+        loopBasin = False
+        basinConnection = False
+        feature = self.drainage.getFeature(segment.featureId)
+
+        if not feature:
+            return 0, None
+
+        if segment.isMouth:
+            # A feição corrente é a feição da foz e o segmento pai é do
+            # limite da bacia. É o início do processamento de uma bacia!
+
+            # Verificando se a feição da foz já foi processada.
+            if feature.mouthFeatureId < 0:
+                # Árvore ainda não processada.
+                feature.mouthFeatureId = feature.featureId
+            else:
+                # Árvore já processada. Existe interconexão entre bacias!
+                basinConnection = True
+        else:
+            destFeature = self.drainage.getFeature(destination.featureId)
+            if destFeature and feature.mouthFeatureId < 0:
+                feature.mouthFeatureId = destFeature.featureId
+            else:
+                # Feição já processada! Loop!
+                loopBasin = True
+
+        # Verificando a condição de loop na árvore ou interconexão entre árvores.
+        if loopBasin or basinConnection:  # Feição já processada!
+            msg_1 = "Erro! impossível continuar! Estrutura topológica não esperada para hierarquização."
+            msg_5 = "Confira a topologia e execute o processamento novamente."
+            if loopBasin:
+                # Gravando o erro no log.
+                self.log.append(
+                    f"{msg_1} Existem feições em anel (loop).\n"
+                    f"Verifique as feições: FID {segment.featureId + 1}"
+                    f" e FID {destination.featureId + 1}.\n\n{msg_5}"
+                )
+                return 5, None
+
+            # Conexão entre bacias. Gravando o erro no log.
+            self.log.append(
+                f"{msg_1} Os sistemas de drenagem associados a foz FID "
+                f"{feature.featureId + 1} e a foz FID "
+                f"{feature.mouthFeatureId + 1} estão conectados.\n\n{msg_5}"
+            )
+            return 6, None
+
+        node = Node(segment.featureId)
+
+        # Processando o fluxo.
+        if len(feature.segmentsList) > 1:  # Vários segmentos.
+            if segment.segmentId == 0:
+                node.flow = 2  # Inverter!
+            else:
+                node.flow = 1  # Manter!
+        else:  # Segmento único.
+            # Verificando se o vértice "a" do segmento encosta no pai.
+            if segment.a.equalsTo(destination.a) or segment.a.equalsTo(
+                destination.b
+            ):
+                # TODO Maybe we should also invert the vertexes here?
+                # TODO Maybe we should invert the segments here?
+                if segment.a.vertexId == 0:
+                    node.flow = 2  # Inverter!
+                else:
+                    node.flow = 1  # Manter!
+            else:  # Então é o vértice "b" que encosta no pai.
+                if segment.b.vertexId == 0:
+                    node.flow = 2  # Inverter!
+                else:
+                    node.flow = 1  # Manter!
 
-                        if self.params.shreveOrderEnabled:
-                            node.shreve = childNode.shreve
+        # Obtendo os filhos.
+        childSegments = self.topologicalRelations.findChildSegments(
+            segment.featureId,
+            -1 if destination.setId == 1 else destination.featureId,
+            sibling_nodes,
+        )
 
-                else:
-                    if len(childSegments) > 2:
-                        # Gravando a mensagem de mais de três afluentes no log.
-                        self._log_too_many_children(segment, childSegments)
-                        self.params.strahlerOrderType = 2
-
-                    # Cadastrando os nós filhos.
-                    for child in childSegments:
-                        result, childNode = self.createNodes(
-                            child, segment, childSegments, result
-                        )
-                        if result == 0 and childNode:
-                            # As regras para a classificação por Strahler e Shreve
-                            # estão no método No::inserirFilhoNo().
-                            node.addChild(childNode)
-
-                # Gravando classificação.
-                if result == 0:
-                    self.drainage.setFeatureClassification(
-                        featureId=node.featureId,
-                        flow=node.flow,
-                        strahler=node.strahler,
-                        shreve=node.shreve,
-                    )
-            else:  # Feição já processada!
-                msg_1 = "Erro! impossível continuar! Estrutura topológica não esperada para hierarquização."
-                msg_5 = "Confira a topologia e execute o processamento novamente."
-                if loopBasin:
-                    result = 5
-
-                    # Gravando o erro no log.
-                    self.log.append(
-                        f"{msg_1} Existem feições em anel (loop).\n"
-                        f"Verifique as feições: FID {segment.featureId + 1}"
-                        f" e FID {destination.featureId + 1}.\n\n{msg_5}"
-                    )
-                else:  # Conexão entre bacias.
-                    result = 6
-
-                    # Gravando o erro no log.
-                    self.log.append(
-                        f"{msg_1} Os sistemas de drenagem associados a foz FID "
-                        f"{feature.featureId + 1} e a foz FID "
-                        f"{feature.mouthFeatureId + 1} estão conectados.\n\n{msg_5}"
-                    )
+        # Instanciar o nó com valor inicial 1 para Strahler e Shreve
+        # para eliminar a necessidade de definit os valores para os nós.
+        # Não será necessário avaliar (filhosSegmento.size() == 0).
+        if not childSegments:  # Nó sem filhos. É folha!
+            # Classificando por Strahler
+            if self.params.strahlerOrderType > 0:
+                node.strahler = 1
+            # Classificando por Shreve.
+            if self.params.shreveOrderEnabled:
+                node.shreve = 1
+
+        elif len(childSegments) > 2:
+            # Gravando a mensagem de mais de três afluentes no log.
+            self._log_too_many_children(segment, childSegments)
+            self.params.strahlerOrderType = 2
 
-        return result, node
+        return 0, NodeFrame(segment, node, childSegments)
 
     def _log_too_many_children(
         self, segment: Segment, childSegments: list[Segment]
@@ -446,12 +744,14 @@ class Classificator:
         for i, child in enumerate(childSegments):
             self.log.append(f"   {i + 1} - FID {child.featureId + 1}")
 
-    def evaluateProcessing(self) -> int:
+    def evaluateProcessing(self, features: Optional[list[Feature]] = None) -> int:
         result = 0
 
-        for i in range(self.drainage.getTotalFeatures()):
-            feature = self.drainage.getFeature(i)
-            if feature and (
+        if features is None:
+            features = self.drainage.featuresList + self.drainage.newFeaturesList
+
+        for feature in features:
+            if (
                 feature.flow == 0
                 or (self.params.strahlerOrderType > 0 and feature.strahler == 0)
                 or (self.params.shreveOrderEnabled and feature.shreve == 0)
@@ -0,0 +1,340 @@
+"""
+Classificação sem interface gráfica:
+
+    python -m hydroflow classify --drainage rios.shp --boundary bacia.shp \
+        --out classificada.shp --log classificada.txt --strahler --shreve
+
+    python -m hydroflow batch --manifest bacias.csv --summary resumo.csv \
+        --workers 8 --strahler --shreve
+
+Roda o mesmo processamento do formulário (Controller.classify e
+Controller.save) sob um QgsApplication em modo offscreen. No modo batch,
+cada linha do manifesto (colunas drainage, boundary, out e, opcionalmente,
+log) é uma bacia, processada em um pool de processos; cada processo
+inicializa o QGIS uma única vez. Os modos paralelos (--per-basin,
+--components e --slabs) abrem outro pool em cada processo do lote; sem
+--partition-workers, as CPUs são divididas entre os dois pools.
+"""
+
+import argparse
+import contextlib
+import csv
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal, InvalidOperation
+from typing import Any, Optional
+
+from qgis.core import QgsApplication
+
+from .controller import Controller
+from .params import Params
+
+EPILOG = """
+Códigos de saída:
+  0 - processamento concluído (com ou sem alertas)
+  2 - foz não identificada
+  3 - mais de uma foz identificada
+  4 - feição com mais de dois afluentes
+  5 - relações topológicas inesperadas ou feições em anel (loop)
+  6 - bacias interconectadas
+  10 - arquivo da rede de drenagem inválido
+  11 - arquivo do limite da bacia inválido
+  12 - falha na gravação do resultado
+  13 - erro inesperado (modo batch, detalhado no resumo)
+"""
+
+# Params.topologyEngine, na ordem dos códigos.
+ENGINES = ["sweep", "rtree", "grid"]
+
+SUMMARY_FIELDS = [
+    "drainage",
+    "boundary",
+    "out",
+    "log",
+    "code",
+    "seconds",
+    "messages",
+    "error",
+]
+
+# QgsApplication de cada processo do pool (modo batch).
+workerApp: Optional[QgsApplication] = None
+
+
+def tolerance(value: str) -> Decimal:
+    try:
+        result = Decimal(value)
+    except InvalidOperation as error:
+        raise argparse.ArgumentTypeError(
+            f"Tolerância XY inválida: {value}"
+        ) from error
+    if result < 0:
+        raise argparse.ArgumentTypeError(
+            "O valor da Tolerância XY não pode ser negativo!"
+        )
+    return result
+
+
+def parser() -> argparse.ArgumentParser:
+    result = argparse.ArgumentParser(
+        prog="hydroflow",
+        description="Hierarquização de redes de drenagem (Strahler e Shreve).",
+    )
+    commands = result.add_subparsers(dest="command", required=True)
+
+    classify = commands.add_parser(
+        "classify",
+        help="classifica uma bacia e grava o shapefile resultante",
+        epilog=EPILOG,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    classify.add_argument("--drainage", required=True, help="SHP da drenagem")
+    classify.add_argument("--boundary", required=True, help="SHP do limite da bacia")
+    classify.add_argument("--out", required=True, help="SHP de saída")
+    classify.add_argument("--log", help="arquivo texto para o log do processamento")
+    addOptions(classify)
+
+    batch = commands.add_parser(
+        "batch",
+        help="classifica as bacias de um manifesto CSV em paralelo",
+        description=(
+            "Cada processo do lote abre o seu próprio pool nos modos paralelos\n"
+            "(--per-basin, --components, --slabs). Sem --partition-workers, cada\n"
+            "pool recebe CPUs / --workers processos (no mínimo um)."
+        ),
+        epilog=EPILOG,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    batch.add_argument(
+        "--manifest",
+        required=True,
+        help="CSV com as colunas drainage, boundary, out e log (opcional)",
+    )
+    batch.add_argument("--summary", help="CSV de resumo (padrão: saída padrão)")
+    batch.add_argument(
+        "--workers", type=int, default=os.cpu_count(), help="processos do pool"
+    )
+    addOptions(batch)
+    return result
+
+
+def parseArgs(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    command = parser()
+    args = command.parse_args(argv)
+    # Sem a grade (que precisa de tolerância) não há chave exata para
+    # intercalar os eventos, e Params ignoraria a opção.
+    if args.merge_events and not (args.snap_to_grid and args.tolerance > 0):
+        command.error("--merge-events requer --snap-to-grid e --tolerance > 0")
+    return args
+
+
+def addOptions(command: argparse.ArgumentParser) -> None:
+    command.add_argument("--tolerance", type=tolerance, default=Decimal(0))
+    command.add_argument("--strahler", action="store_true")
+    command.add_argument("--shreve", action="store_true")
+    command.add_argument(
+        "--monitor-point",
+        type=int,
+        metavar="N",
+        help="sugere N pontos de monitoramento (Sharp)",
+    )
+    command.add_argument("--float-geometry", action="store_true")
+    command.add_argument("--snap-to-grid", action="store_true")
+    command.add_argument(
+        "--merge-events",
+        action="store_true",
+        help="gera os eventos da varredura feição a feição (com --snap-to-grid)",
+    )
+    command.add_argument(
+        "--chains",
+        action="store_true",
+        help="varre os segmentos de cada feição como cadeias monótonas em x",
+    )
+    command.add_argument("--cache", action="store_true")
+    command.add_argument("--boundary-filter", action="store_true")
+    command.add_argument(
+        "--per-basin",
+        action="store_true",
+        help="classifica cada polígono do limite como uma bacia (campo Bacia)",
+    )
+    command.add_argument(
+        "--components",
+        action="store_true",
+        help="varre em separado as partes da drenagem que não se tocam",
+    )
+    command.add_argument(
+        "--slabs",
+        type=int,
+        default=0,
+        metavar="K",
+        help="varre o plano em K faixas verticais, em paralelo",
+    )
+    command.add_argument(
+        "--engine",
+        choices=ENGINES,
+        default="sweep",
+        help="busca das relações: linha de varredura, R-tree ou grade (NumPy)",
+    )
+    command.add_argument(
+        "--partition-workers",
+        type=int,
+        default=0,
+        metavar="N",
+        help="processos dos modos paralelos (padrão: um por CPU; no lote, "
+        "as CPUs divididas pelos --workers)",
+    )
+
+
+def buildParams(args: argparse.Namespace) -> Params:
+    params = Params(
+        origin=None,
+        drainageFileName=args.drainage,
+        boundaryFileName=args.boundary,
+        toleranceXY=args.tolerance,
+        strahlerOrderType=1 if args.strahler else 0,
+        shreveOrderEnabled=args.shreve,
+        monitorPointEnabled=args.monitor_point is not None,
+        monitorPointN=args.monitor_point or 5,
+        floatGeometryEnabled=args.float_geometry,
+        snapToGridEnabled=args.snap_to_grid,
+        eventMergeEnabled=args.merge_events,
+        monotoneChainsEnabled=args.chains,
+        featureSetCacheEnabled=args.cache,
+        boundaryFilterEnabled=args.boundary_filter,
+        basinPartitionEnabled=args.per_basin,
+        componentPartitionEnabled=args.components,
+        partitionWorkers=args.partition_workers,
+        sweepSlabs=args.slabs,
+        topologyEngine=ENGINES.index(args.engine),
+    )
+    params.newFileName = args.out
+    return params
+
+
+def classify(args: argparse.Namespace) -> int:
+    return run(buildParams(args), args.log)[0]
+
+
+def run(params: Params, logFileName: Optional[str]) -> tuple[int, int]:
+    """Classifica e grava uma bacia. Retorna o código e o nº de mensagens."""
+    controller = Controller(params)
+
+    code = controller.classify()
+    if code == 2:
+        print("Arquivo da rede de drenagem inválido!", file=sys.stderr)
+        return 10, 0
+    if code == 3:
+        print("Arquivo do limite da bacia inválido!", file=sys.stderr)
+        return 11, 0
+
+    result = controller.result
+    if result in (0, 1):
+        controller.log.result = params.newFileName
+        if controller.save() != 0:
+            result = 12
+
+    if logFileName:
+        controller.log.save(logFileName)
+    else:
+        for message in controller.log.list:
+            print(message, file=sys.stderr)
+
+    return 0 if result == 1 else result, len(controller.log.list)
+
+
+def readManifest(fileName: str) -> list[dict[str, str]]:
+    with open(fileName, newline="", encoding="utf-8") as manifest:
+        jobs = list(csv.DictReader(manifest))
+
+    for line, job in enumerate(jobs, start=2):
+        missing = [
+            name for name in ("drainage", "boundary", "out") if not job.get(name)
+        ]
+        if missing:
+            raise ValueError(
+                f"{fileName}, linha {line}: faltam as colunas {', '.join(missing)}"
+            )
+    return jobs
+
+
+def startQgis() -> QgsApplication:
+    # Sem servidor gráfico: o Qt usa a plataforma offscreen.
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    app = QgsApplication([], False)
+    app.initQgis()
+    return app
+
+
+def initWorker() -> None:
+    global workerApp  # pylint: disable=global-statement
+    workerApp = startQgis()
+
+
+def runJob(job: dict[str, str], args: argparse.Namespace) -> dict[str, Any]:
+    """Executa uma linha do manifesto em um processo do pool."""
+    options = argparse.Namespace(**vars(args))
+    options.drainage = job["drainage"]
+    options.boundary = job["boundary"]
+    options.out = job["out"]
+    logFileName = job.get("log") or os.path.splitext(job["out"])[0] + ".txt"
+
+    row: dict[str, Any] = {**job, "log": logFileName, "messages": 0, "error": ""}
+    start = time.perf_counter()
+    try:
+        row["code"], row["messages"] = run(buildParams(options), logFileName)
+    except Exception:  # pylint: disable=broad-exception-caught
+        row["code"] = 13
+        row["error"] = traceback.format_exc().strip().splitlines()[-1]
+    row["seconds"] = round(time.perf_counter() - start, 3)
+    return row
+
+
+def writeSummary(rows: list[dict[str, Any]], fileName: Optional[str]) -> None:
+    with (
+        open(fileName, "w", newline="", encoding="utf-8")
+        if fileName
+        else contextlib.nullcontext(sys.stdout)
+    ) as summary:
+        writer = csv.DictWriter(summary, SUMMARY_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def batchPartitionWorkers(requested: int, workers: int) -> int:
+    """
+    Processos dos modos paralelos em cada processo do lote. Sem valor
+    explícito, as CPUs são divididas entre os workers processos do lote,
+    em vez de cada um abrir um pool com todas elas.
+    """
+    if requested:
+        return requested
+    return max(1, (os.cpu_count() or 1) // workers)
+
+
+def batch(args: argparse.Namespace) -> int:
+    jobs = readManifest(args.manifest)
+    workers = max(1, min(args.workers or 1, len(jobs) or 1))
+    args.partition_workers = batchPartitionWorkers(args.partition_workers, workers)
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=initWorker,
+    ) as pool:
+        rows = list(pool.map(runJob, jobs, [args] * len(jobs)))
+
+    writeSummary(rows, args.summary)
+    return 0 if all(row["code"] == 0 for row in rows) else 1
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    args = parseArgs(argv)
+    if args.command == "batch":
+        return batch(args)
+
+    app = startQgis()
+    try:
+        return classify(args)
+    finally:
+        app.exitQgis()
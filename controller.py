@@ -1,25 +1,32 @@
-from PyQt5.QtCore import Qt
+from typing import Optional
+
+from qgis.core import QgsApplication, QgsFeedback
 from qgis.PyQt import QtWidgets
 
+from .basin_classificator import BasinClassificator, ComponentClassificator
 from .classificator import Classificator
 from .frmlog import FrmLog
+from .models.feature_set import FeatureSet
 from .monitorpoint import MonitorPoint
 from .params import Params
+from .utils.hydroflow_task import HydroflowTask
 from .utils.message import Message
+from .utils.progress import Progress
 from .utils.shp_feature_set_dao import SHPFeatureSetDAO
 
 
 class Controller:
     def __init__(self, params: Params):
         self.params = params
+        self.log = Message(params)
+        self.dao: Optional[SHPFeatureSetDAO] = None
+        self.drainage: Optional[FeatureSet] = None
+        self.result = 0
+        self.task: Optional[HydroflowTask] = None
 
-    def validateFile(self, fileName: str, baseName: str, shapeType: int) -> bool:
-        return (
-            SHPFeatureSetDAO(self.params.toleranceXY).load_feature_set(
-                fileName, baseName, shapeType
-            )
-            is not None
-        )
+    def validateFile(self, fileName: str, baseName: str) -> bool:
+        # A leitura completa do arquivo fica para a classificação.
+        return SHPFeatureSetDAO().is_valid_file(fileName, baseName)
 
     def displayMessage(self, result: int) -> None:
         if result == 0:
@@ -48,45 +55,102 @@ class Controller:
                 "Processamento não concluído - leia o log para detalhes!",
             )
 
-    def classifyWaterBasin(self, params: Params) -> int:
+    def classifyWaterBasin(self, params: Params) -> None:
         """
-        Códigos de erro:
-        0 - Processamento concluído com sucesso!
-        1 - Processamento concluído com alertas!
-        2 - Foz da bacia hidrográfica não identificada!
-        3 - Foi identificada mais de uma foz na bacia hidrográfica! (listado no log)
-        4 - Foi identificado uma feição com mais de dois afluentes! (listado no log)
-        5 - Relações topológicas inesperadas! (listado no log)
+        Inicia a classificação em uma tarefa do QGIS. A leitura, a varredura
+        e a construção da árvore rodam em segundo plano; o resultado é
+        tratado em finishClassification, na thread da interface.
         """
-
         self.params = params
-        log = Message(params)
+        self.log = Message(params)
+        self.task = HydroflowTask(
+            "Hydroflow: classificando a bacia",
+            self.classify,
+            self.finishClassification,
+        )
+        QgsApplication.taskManager().addTask(self.task)
+
+    def classify(self, feedback: Optional[QgsFeedback] = None) -> int:
+        """
+        Lê os arquivos e classifica a bacia, sem usar a interface gráfica.
+        O código de Classificator.classifyWaterBasin fica em self.result.
+        Códigos de retorno (formulário):
+        0 - Classificação executada.
+        2 - Arquivo da rede de drenagem inválido.
+        3 - Arquivo do limite da bacia inválido.
+        6 - Processamento cancelado.
+        """
+        params = self.params
 
         # Lendo os arquivos de dados.
-        params.origin.setCursor(Qt.WaitCursor)
-        dao = SHPFeatureSetDAO(params.toleranceXY)
+        self.dao = SHPFeatureSetDAO(
+            params.toleranceXY,
+            params.floatGeometryEnabled,
+            params.snapToGridEnabled,
+            params.featureSetCacheEnabled,
+        )
+
+        progress = Progress(feedback, 0, 5)
+        boundary = self.dao.load_feature_set(
+            params.boundaryFileName, "limite", 1, progress
+        )
+        if progress.isCanceled():
+            return 6
 
-        drainage = dao.load_feature_set(params.drainageFileName, "drenagem", 0)
-        boundary = dao.load_feature_set(params.boundaryFileName, "limite", 1)
+        # Lendo apenas a drenagem que pode tocar o limite da bacia.
+        filterRect = None
+        if boundary and params.boundaryFilterEnabled:
+            filterRect = boundary.raw.extent().buffered(float(params.toleranceXY))
 
-        if not drainage:
-            params.origin.setCursor(Qt.ArrowCursor)
+        progress = Progress(feedback, 5, 20)
+        self.drainage = self.dao.load_feature_set(
+            params.drainageFileName, "drenagem", 0, progress, filterRect
+        )
+        if progress.isCanceled():
+            return 6
+
+        if not self.drainage:
             return 2
 
         if not boundary:
-            params.origin.setCursor(Qt.ArrowCursor)
             return 3
 
         # Classificando a bacia.
-        classificator = Classificator(drainage, boundary, params, log)
+        # Cada polígono do limite, ou cada componente conexa da drenagem,
+        # classificado em separado.
+        classifier: type[Classificator] = Classificator
+        if params.basinPartitionEnabled:
+            classifier = BasinClassificator
+        elif params.componentPartitionEnabled:
+            classifier = ComponentClassificator
+        classificator = classifier(
+            self.drainage, boundary, params, self.log, feedback
+        )
 
-        result = classificator.classifyWaterBasin()
+        self.result = classificator.classifyWaterBasin()
+        if self.result == 7:
+            return 6
+        return 0
 
-        params.origin.setCursor(Qt.ArrowCursor)
-        self.displayMessage(result)
+    def finishClassification(self, code: int) -> None:
+        """
+        Códigos de erro (self.result):
+        0 - Processamento concluído com sucesso!
+        1 - Processamento concluído com alertas!
+        2 - Foz da bacia hidrográfica não identificada!
+        3 - Foi identificada mais de uma foz na bacia hidrográfica! (listado no log)
+        4 - Foi identificado uma feição com mais de dois afluentes! (listado no log)
+        5 - Relações topológicas inesperadas! (listado no log)
+        """
+        params = self.params
+        if code != 0:
+            params.origin.displayMessage(code)
+            return
+
+        self.displayMessage(self.result)
 
         # Salvando o novo arquivo.
-        if result in (0, 1):
+        if self.result in (0, 1):
             # Obtendo nome do novo arquivo.
             new = QtWidgets.QFileDialog.getSaveFileName(
                 params.origin,
@@ -95,27 +159,51 @@ class Controller:
                 "Shape File(*.shp)",
             )[0]
             if new != "":
-                params.origin.setCursor(Qt.WaitCursor)
                 params.newFileName = new
-                log.result = new
-
-                if params.monitorPointEnabled:
-                    mp = MonitorPoint(drainage)
-                    mp.run(log)
+                self.log.result = new
 
-                # Gravando os arquivos.
-                dao.save_feature_set(drainage, params, log)
+                # Gravando os arquivos em segundo plano.
+                self.task = HydroflowTask(
+                    "Hydroflow: gravando a bacia classificada",
+                    self.save,
+                    self.finishSave,
+                )
+                QgsApplication.taskManager().addTask(self.task)
+                return
 
-                params.origin.setCursor(Qt.ArrowCursor)
+        self.displayLog()
 
-            result = 0
+    def save(self, feedback: Optional[QgsFeedback] = None) -> int:
+        """
+        Códigos de retorno (formulário):
+        0 - Arquivo gravado.
+        6 - Processamento cancelado.
+        9 - Arquivo não gravado.
+        """
+        if not self.dao or not self.drainage:
+            return 9
+
+        if self.params.monitorPointEnabled:
+            mp = MonitorPoint(self.drainage)
+            mp.run(self.log)
+
+        if self.dao.save_feature_set(self.drainage, self.params, self.log, feedback):
+            return 0
+        if feedback is not None and feedback.isCanceled():
+            return 6
+        return 9
+
+    def finishSave(self, code: int) -> None:
+        if code == 0 and self.dao:
+            self.dao.add_result_layer(self.params)
         else:
-            result = 9
+            self.params.origin.displayMessage(code)
 
+        self.displayLog()
+
+    def displayLog(self) -> None:
         # Verificando se há mensagens no log.
-        if log.hasMessages():
-            formLog = FrmLog(params.origin, log)
+        if self.log.hasMessages():
+            formLog = FrmLog(self.params.origin, self.log)
             formLog.show()
             formLog.displayLog()
-
-        return result
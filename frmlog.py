@@ -67,15 +67,8 @@ class FrmLog(QtWidgets.QDialog, Ui_FrmLog):
         logFileName = QtWidgets.QFileDialog.getSaveFileName(
             self, "Salvar arquivo como", "", "(*.txt)"
         )[0]
-        try:
-            logFile = open(logFileName, "w")
-            if logFile:
-                logFile.write(self.message.getHeader() + "\n")
-                for item in self.message.list:
-                    logFile.write(item + "\n")
-                logFile.write(self.message.getFooter() + "\n")
-        finally:
-            logFile.close()
+        if logFileName:
+            self.message.save(logFileName)
 
     def list(self, message: str) -> None:
         self.textEdit.append(message)
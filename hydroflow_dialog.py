@@ -24,7 +24,7 @@
 
 import traceback
 from decimal import Decimal
-from typing import Any
+from typing import Any, Optional
 
 from PyQt5 import QtWidgets
 from PyQt5.QtCore import pyqtSlot
@@ -45,6 +45,7 @@ class HydroflowDialog(QtWidgets.QDialog, Ui_HydroflowDialogBase):
         # http://qt-project.org/doc/qt-4.8/designer-using-a-ui-file.html
         # #widgets-and-dialogs-with-auto-connect
         self.setupUi(self)
+        self.controller: Optional[Controller] = None
 
     def get_path(self, titulo: str) -> Any:
         return QtWidgets.QFileDialog.getOpenFileName(
@@ -150,17 +151,18 @@ class HydroflowDialog(QtWidgets.QDialog, Ui_HydroflowDialogBase):
 
             con = Controller(params)
 
-            if not con.validateFile(drainageFileName, "drenagem", 0):
+            if not con.validateFile(drainageFileName, "drenagem"):
                 self.displayMessage(2)
                 return
 
-            if not con.validateFile(boundaryFileName, "limite", 1):
+            if not con.validateFile(boundaryFileName, "limite"):
                 self.displayMessage(3)
                 return
 
-            # Iniciando o processo.
-            resultado = con.classifyWaterBasin(params)
-            self.displayMessage(resultado)  # Valores para resultado: 0, 2, 3 ou 9.
+            # Iniciando o processo em segundo plano. O controlador é mantido
+            # no formulário enquanto a tarefa estiver em execução.
+            self.controller = con
+            con.classifyWaterBasin(params)
         except Exception:  # pylint: disable=broad-exception-caught
             QgsMessageLog.logMessage(
                 traceback.format_exc(), "Hydroflow", Qgis.MessageLevel.Critical, True
@@ -175,6 +177,9 @@ class HydroflowDialog(QtWidgets.QDialog, Ui_HydroflowDialogBase):
         2 - Arquivo da rede de drenagem inválido ou não pode ser acessado!
         3 - Arquivo do limite da bacia/exutório inválido ou não pode ser acessado!
         4 - O valor da Tolerância XY não pode ser negativo!
+        5 - Houve um erro inesperado.
+        6 - Processamento cancelado.
+        9 - Arquivo da bacia classificada não gravado.
         """
         title = "Atenção"
         if error_code == 1:
@@ -206,3 +211,11 @@ class HydroflowDialog(QtWidgets.QDialog, Ui_HydroflowDialogBase):
                 title,
                 "Houve um erro inesperado. O processamento foi interrompido!",
             )
+        elif error_code == 6:
+            QtWidgets.QMessageBox.about(self, "Aviso", "Processamento cancelado!")
+        elif error_code == 9:
+            QtWidgets.QMessageBox.warning(
+                self,
+                title,
+                "A bacia classificada não foi gravada - leia o log para detalhes!",
+            )
@@ -12,6 +12,7 @@ class Feature:
         self,
         geometry: QgsGeometry,
         featureId: int = -1,
+        sourceId: int = -1,
         setId: int = -1,
         mouthFeatureId: int = -1,
         featureType: int = 0,
@@ -25,6 +26,7 @@ class Feature:
     ) -> None:
         self.geometry = geometry
         self.featureId = featureId
+        self.sourceId = sourceId  # FID da feição no arquivo de origem.
         self.setId = setId
         self.mouthFeatureId = mouthFeatureId
         self.featureType = featureType
@@ -36,6 +38,7 @@ class Feature:
         self.segmentsList = segmentsList or []
         self.process = process
         self.hasObservation = hasObservation
+        self.basinId = 0  # Polígono do limite (modo por bacia).
 
     def __str__(self) -> str:
         return (
@@ -1,12 +1,12 @@
 from decimal import Decimal
-from typing import Optional
+from typing import Any, Callable, Optional
 
-from qgis.core import Qgis, QgsVectorLayer
+from qgis.core import Qgis, QgsRectangle, QgsVectorLayer
 
-from .attribute import Attribute
 from .feature import Feature
 from .new_feature_attribute import NewFeatureAttributes
 from .observation import Observation
+from .segment import Segment
 
 
 class FeatureSet:
@@ -23,11 +23,17 @@ class FeatureSet:
         self.typeCode = typeCode
         self.featuresList: list[Feature] = []
         self.newFeaturesList: list[Feature] = []
-        self.newFeaturesAttributes: list[NewFeatureAttributes] = []
+        self.newFeaturesAttributes: dict[int, NewFeatureAttributes] = {}
         self.obs = obs
         self.raw = raw
+        # Filtro usado na leitura de raw, repetido na gravação.
+        self.filterRect: Optional[QgsRectangle] = None
+        # Feições por featureId, quando os ids não são posições (subset).
+        self.featureIndex: Optional[dict[int, Feature]] = None
 
     def getFeature(self, featureId: int) -> Optional[Feature]:
+        if self.featureIndex is not None:
+            return self.featureIndex.get(featureId)
         if 0 <= featureId < len(self.featuresList):
             return self.featuresList[featureId]
         if len(self.featuresList) <= featureId < self.getTotalFeatures():
@@ -58,11 +64,52 @@ class FeatureSet:
         if sharp:
             feature.sharp = sharp
 
-    def getNewFeatureAttributes(self, featureId: int) -> Optional[list[Attribute]]:
-        for reg in self.newFeaturesAttributes:
-            if featureId == reg.featureId:
-                return reg.attributes
-        return None
+    def getNewFeatureAttributes(self, featureId: int) -> Optional[list[Any]]:
+        reg = self.newFeaturesAttributes.get(featureId)
+        return reg.attributes if reg else None
 
     def getTotalFeatures(self) -> int:
         return len(self.featuresList) + len(self.newFeaturesList)
+
+    def subset(
+        self,
+        features: list[Feature],
+        keep: Optional[Callable[[Segment], bool]] = None,
+    ) -> "FeatureSet":
+        """
+        Cópia das feições informadas, com os mesmos featureIds e segmentos
+        próprios, já que a classificação altera feições e segmentos. Sem a
+        camada de origem e as geometrias, pode ser enviada a outro processo.
+        Com keep, só os segmentos aceitos (e os seus vértices) são copiados,
+        e as feições sem nenhum deles ficam de fora.
+        """
+        result = FeatureSet(
+            self.featureSetId, self.fileName, self.typeCode, Observation(), None
+        )
+        result.featureIndex = {}
+        for feature in features:
+            segments = feature.segmentsList
+            vertices = feature.vertexList
+            if keep is not None:
+                segments = [s for s in segments if keep(s)]
+                if not segments:
+                    continue
+                used = {id(s.a) for s in segments} | {id(s.b) for s in segments}
+                vertices = [v for v in vertices if id(v) in used]
+            copy = Feature(
+                None,
+                featureId=feature.featureId,
+                sourceId=feature.sourceId,
+                setId=feature.setId,
+                featureType=int(feature.featureType),
+                vertexList=vertices,
+                process=feature.process,
+                hasObservation=feature.hasObservation,
+            )
+            copy.segmentsList = [
+                Segment(s.segmentId, s.featureId, s.setId, s.a, s.b)
+                for s in segments
+            ]
+            result.featuresList.append(copy)
+            result.featureIndex[copy.featureId] = copy
+        return result
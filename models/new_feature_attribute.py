@@ -1,7 +1,10 @@
-from .attribute import Attribute
+from typing import Any
 
 
 class NewFeatureAttributes:
-    def __init__(self, attributes: list[Attribute], featureId: int = -1):
+    # Valores nativos da feição original, compartilhados entre as suas partes.
+    __slots__ = ("featureId", "attributes")
+
+    def __init__(self, attributes: list[Any], featureId: int = -1):
         self.featureId = featureId
         self.attributes = attributes
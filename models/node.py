@@ -1,4 +1,13 @@
 class Node:
+    __slots__ = (
+        "featureId",
+        "flow",
+        "shreve",
+        "children",
+        "strahlerValues",
+        "_strahler",
+    )
+
     def __init__(self, featureId: int) -> None:
         self.featureId = featureId
         self.flow = 0
@@ -1,4 +1,6 @@
 class ObservationItem:
+    __slots__ = ("featureId", "text")
+
     def __init__(self) -> None:
         self.featureId = 0
         self.text = ""
@@ -1,3 +1,4 @@
+import random
 from decimal import Decimal
 from typing import Optional
 
@@ -5,29 +6,51 @@ from ..utils.geometry import Geometry
 from ..utils.message import Message
 from .segment import Segment
 
+MAX_LEVEL = 32
+
+
+class PositionNode:
+    __slots__ = ("segment", "next", "prev")
+
+    def __init__(self, segment: Optional[Segment], level: int) -> None:
+        self.segment = segment
+        self.next: list[Optional[PositionNode]] = [None] * level
+        self.prev: list[Optional[PositionNode]] = [None] * level
+
 
 class Position:
+    """
+    Estrutura de status da linha de varredura.
+    Lista de saltos (skip list) ordenada por comparePosition na coordenada x
+    da varredura, com ligações duplas em todos os níveis. Os nós são
+    retornados como referência para as consultas de vizinhança (above/below),
+    troca (swap) e exclusão (delete).
+    """
+
     def __init__(self, geo: Geometry, log: Message) -> None:
         self.geo = geo
         self.log = log
-        self.list: list[Segment] = []
-
-    def locate(self, scanLine: Decimal, segment: Segment) -> int:
-        start = 0
-        end = len(self.list) - 1
-        while start <= end:
-            middle = (start + end) // 2
-            item = self.list[middle]
-
-            if segment.compareTo(item) == 0:
-                return middle
-            comparison = self.comparePosition(scanLine, segment, item)
-            if comparison < 0:
-                start = middle + 1
-            else:
-                end = middle - 1
-
-        return -1
+        self.head = PositionNode(None, MAX_LEVEL)
+        self.level = 1
+        self.nodes: dict[Segment, PositionNode] = {}
+        self.random = random.Random(0)
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    @property
+    def list(self) -> list[Segment]:
+        result = []
+        node = self.head.next[0]
+        while node is not None and node.segment is not None:
+            result.append(node.segment)
+            node = node.next[0]
+        return result
+
+    def locate(self, scanLine: Decimal, segment: Segment) -> Optional[PositionNode]:
+        # A referência do nó é mantida desde a inserção; scanLine é aceito
+        # apenas por compatibilidade com a busca por comparePosition.
+        return self.nodes.get(segment)
 
     def comparePosition(
         self, scanLine: Decimal, first: Segment, second: Segment
@@ -100,47 +123,103 @@ class Position:
         # Alturas relativas diferentes.
         return self.geo.compare(pFirst.y, pSecond.y)
 
-    def insert(self, segment: Segment) -> int:
-        if not self.list:
-            self.list.append(segment)
-            return 0
-
-        start = 0
-        end = len(self.list) - 1
-        while True:
-            middle = (start + end) // 2
-            item = self.list[middle]
-            comp = self.comparePosition(segment.a.x, segment, item)
-
-            if comp < 0:
-                if middle == end:
-                    if middle == len(self.list) - 1:
-                        self.list.append(segment)
-                        return len(self.list) - 1
-                    self.list.insert(middle + 1, segment)
-                    return middle + 1
-                start = middle + 1
-            elif comp > 0:
-                if middle == start:
-                    self.list.insert(middle, segment)
-                    return middle
-                end = middle - 1
-            else:
-                return middle
-
-    def delete(self, indice: int) -> None:
-        if self.list and indice < len(self.list):
-            self.list.pop(indice)
-
-    def above(self, index: int) -> Optional[Segment]:
-        if self.list and 0 < index < len(self.list):
-            return self.list[index - 1]
+    def randomLevel(self) -> int:
+        level = 1
+        while level < MAX_LEVEL and self.random.random() < 0.5:
+            level += 1
+        return level
+
+    def insert(self, segment: Segment) -> Optional[PositionNode]:
+        update: list[PositionNode] = [self.head] * MAX_LEVEL
+        node = self.head
+        compared: Optional[PositionNode] = None
+
+        for level in reversed(range(self.level)):
+            following = node.next[level]
+            while following is not None and following is not compared:
+                assert following.segment is not None
+                comp = self.comparePosition(segment.a.x, segment, following.segment)
+                if comp == 0:
+                    return following
+                if comp > 0:
+                    compared = following
+                    break
+                node = following
+                following = node.next[level]
+            update[level] = node
+
+        newLevel = self.randomLevel()
+        self.level = max(self.level, newLevel)
+
+        inserted = PositionNode(segment, newLevel)
+        for level in range(newLevel):
+            previous = update[level]
+            following = previous.next[level]
+            inserted.prev[level] = previous
+            inserted.next[level] = following
+            if following is not None:
+                following.prev[level] = inserted
+            previous.next[level] = inserted
+
+        self.nodes[segment] = inserted
+        return inserted
+
+    def delete(self, node: Optional[PositionNode]) -> None:
+        if node is None or node.segment is None:
+            return
+
+        for level, previous in enumerate(node.prev):
+            following = node.next[level]
+            if previous is not None:
+                previous.next[level] = following
+            if following is not None:
+                following.prev[level] = previous
+
+        while self.level > 1 and self.head.next[self.level - 1] is None:
+            self.level -= 1
+
+        del self.nodes[node.segment]
+        node.segment = None
+
+    def fits(self, node: PositionNode, segment: Segment) -> bool:
+        """
+        Se o segmento pode ocupar o lugar do nó: insert o colocaria entre os
+        mesmos vizinhos.
+        """
+        above = self.above(node)
+        if above and self.comparePosition(segment.a.x, segment, above) >= 0:
+            return False
+        below = self.below(node)
+        if below and self.comparePosition(segment.a.x, segment, below) <= 0:
+            return False
+        return True
+
+    def replace(self, node: PositionNode, segment: Segment) -> PositionNode:
+        """Troca o segmento do nó, mantendo a sua posição."""
+        if node.segment is not None:
+            del self.nodes[node.segment]
+        node.segment = segment
+        self.nodes[segment] = node
+        return node
+
+    def above(self, node: Optional[PositionNode]) -> Optional[Segment]:
+        if node is not None and node.prev[0] is not None:
+            return node.prev[0].segment
         return None
 
-    def below(self, index: int) -> Optional[Segment]:
-        if self.list and index < len(self.list) - 1:
-            return self.list[index + 1]
+    def below(self, node: Optional[PositionNode]) -> Optional[Segment]:
+        if node is not None and node.next[0] is not None:
+            return node.next[0].segment
         return None
 
-    def swap(self, first: int, second: int) -> None:
-        self.list[first], self.list[second] = self.list[second], self.list[first]
+    def swap(
+        self, first: Optional[PositionNode], second: Optional[PositionNode]
+    ) -> None:
+        if first is None or second is None:
+            return
+        if first.segment is None or second.segment is None:
+            return
+
+        first.segment, second.segment = second.segment, first.segment
+        self.nodes[first.segment] = first
+        self.nodes[second.segment] = second
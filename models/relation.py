@@ -1,10 +1,13 @@
-import functools
+import bisect
+from typing import Optional
 
 from ..utils.message import Message
 from .segment import Segment
 
 
 class RelationItem:
+    __slots__ = ("source", "destination", "relationType")
+
     def __init__(
         self,
         source: Segment,
@@ -16,22 +19,34 @@ class RelationItem:
         self.relationType = relationType
 
 
-class IndexItem:
-    def __init__(self, featureId: int, value: int):
-        self.featureId = featureId
-        self.value = value
-
-
 class Relation:
+    """
+    Relações topológicas indexadas por (FID origem, FID destino, tipo).
+    As relações de encosta também são mantidas em listas de adjacência por
+    feição, ordenadas pela chave, para a busca dos afluentes em createNodes.
+    """
+
     def __init__(self, log: Message) -> None:
         self.log = log
 
-        self.items: list[RelationItem] = []
-        self.err: list[RelationItem] = []
+        self.relations: dict[tuple[int, int, int], RelationItem] = {}
+        self.errors: dict[tuple[int, int, int], RelationItem] = {}
+        self.adjacency: dict[int, list[RelationItem]] = {}
+
         self.mouths: list[RelationItem] = []
+        self.mouthFeatures: set[int] = set()
+
+        # Chamadas de addRelation, na ordem, quando gravadas (varredura por
+        # faixas).
+        self.history: Optional[list[tuple[Segment, Segment, int]]] = None
 
-        self.index: list[IndexItem] = []
-        self.primaryIndex: list[IndexItem] = []
+    def sortedItems(self) -> list[RelationItem]:
+        """Relações de encosta em ordem de chave. Ordena a cada chamada."""
+        return [self.relations[key] for key in sorted(self.relations)]
+
+    def sortedErrors(self) -> list[RelationItem]:
+        """Relações inesperadas em ordem de chave. Ordena a cada chamada."""
+        return [self.errors[key] for key in sorted(self.errors)]
 
     def insert(
         self,
@@ -39,41 +54,28 @@ class Relation:
         destination: Segment,
         relation_type: int,
     ) -> None:
-        new_item = RelationItem(source, destination, relation_type)
-        target_list = self.items if relation_type == 0 else self.err
-
-        if len(target_list) == 0:
-            target_list.append(RelationItem(source, destination, relation_type))
+        key = (source.featureId, destination.featureId, relation_type)
+        target = self.relations if relation_type == 0 else self.errors
+        if key in target:
             return
 
-        start = 0
-        end = len(target_list) - 1
-        while start <= end:
-            middle = (start + end) // 2
-            item = target_list[middle]
-            comp = self.comparePosition(new_item, item)
+        item = RelationItem(source, destination, relation_type)
+        target[key] = item
 
-            if comp < 0:
-                if start in (middle, end):
-                    target_list.insert(middle, new_item)
-                    return
-                if start < middle:
-                    end = middle - 1
-                else:
-                    target_list.insert(0, new_item)
-                    return
-
-            elif comp > 0:
-                if middle == len(target_list) - 1:
-                    target_list.append(new_item)
-                    return
-                if start == end:
-                    target_list.insert(middle, new_item)
-                    return
-                start = middle + 1
+        if relation_type == 0:
+            for featureId in (source.featureId, destination.featureId):
+                bisect.insort(
+                    self.adjacency.setdefault(featureId, []),
+                    item,
+                    key=self.relationKey,
+                )
 
-            else:
-                return
+    def relationKey(self, item: RelationItem) -> tuple[int, int, int]:
+        return (
+            item.source.featureId,
+            item.destination.featureId,
+            item.relationType,
+        )
 
     def addMouth(self, drainage: Segment, boundary: Segment) -> None:
         # Garantindo que o primeiro argumento é da bacia.
@@ -86,14 +88,9 @@ class Relation:
             item = RelationItem(boundary, drainage, 0)
 
         # Garantindo que a foz não foi incluida antes.
-        found = False
-        for mouth in self.mouths:
-            if item.source.featureId == mouth.source.featureId:
-                found = True
-                break
-
-        if not found:
+        if item.source.featureId not in self.mouthFeatures:
             # Inserindo em fozes.
+            self.mouthFeatures.add(item.source.featureId)
             self.mouths.append(item)
 
     def addRelation(
@@ -105,6 +102,9 @@ class Relation:
         1 - Toca
         2 - Intercepta
         """
+        if self.history is not None:
+            self.history.append((source, destination, relationType))
+
         # Garantindo que o FID do primeiro segmento seja menor que o FID do segundo.
         if destination.featureId < source.featureId:
             source, destination = destination, source
@@ -127,120 +127,25 @@ class Relation:
         self, featureId: int, destFeatureId: int, siblings: list[Segment]
     ) -> list[Segment]:
         result = []
-        # Obtendo o índice primário.
-        primaryPos = self.findPrimaryIndex(featureId)
-
-        if primaryPos >= 0:
-            done = False
-            while not done and primaryPos < len(self.index):
-                # Obtendo o índice do evento.
-                item = self.index[primaryPos]
-
-                if item.featureId == featureId:
-                    # Lendo evento.
-                    eventItem = self.items[item.value]
-
-                    relatedSegment = None
-                    if (
-                        eventItem.source.featureId == featureId
-                        and eventItem.destination.featureId != destFeatureId
-                    ):
-                        relatedSegment = eventItem.destination
-                    elif (
-                        eventItem.destination.featureId == featureId
-                        and eventItem.source.featureId != destFeatureId
-                    ):
-                        relatedSegment = eventItem.source
-
-                    if relatedSegment:
-                        isChild = True
-                        for childSegment in siblings:
-                            if relatedSegment.featureId == childSegment.featureId:
-                                isChild = False
-                        if isChild:
-                            result.append(relatedSegment)
-
-                    primaryPos += 1
-                else:
-                    done = True
-
-        return list(result)
-
-    def comparePosition(self, a: RelationItem, b: RelationItem) -> int:
-        if all(
-            [
-                a.source.featureId == b.source.featureId,
-                a.destination.featureId == b.destination.featureId,
-                a.relationType == b.relationType,
-            ]
-        ):
-            return 0
-        if any(
-            [
-                a.source.featureId < b.source.featureId,
-                (
-                    a.source.featureId == b.source.featureId
-                    and a.destination.featureId < b.destination.featureId
-                ),
-                (
-                    a.source.featureId == b.source.featureId
-                    and a.destination.featureId == b.destination.featureId
-                    and a.relationType < b.relationType
-                ),
-            ]
-        ):
-            return -1
-        if any(
-            [
-                a.source.featureId > b.source.featureId,
-                (
-                    a.source.featureId == b.source.featureId
-                    and a.destination.featureId > b.destination.featureId
-                ),
-                (
-                    a.source.featureId == b.source.featureId
-                    and a.destination.featureId == b.destination.featureId
-                    and a.relationType > b.relationType
-                ),
-            ]
-        ):
-            return 1
-        return 0
-
-    def findPrimaryIndex(self, featureId: int) -> int:
-        for item in self.primaryIndex:
-            if featureId == item.featureId:
-                return item.value
-        return -1
-
-    def compareIndexItems(self, a: IndexItem, b: IndexItem) -> int:
-        return (
-            a.value - b.value
-            if a.featureId == b.featureId
-            else a.featureId - b.featureId
-        )
-
-    def buildIndexes(self) -> None:
-        # Montando índice principal.
-        self.index.clear()
-
-        eventItem = None
-        for i, eventItem in enumerate(self.items):
-            # Verificando se são ocorrências de bacia.
-            self.index.append(IndexItem(eventItem.source.featureId, i))
-            self.index.append(IndexItem(eventItem.destination.featureId, i))
-
-        # Ordenando o índice principal.
-        self.index.sort(key=functools.cmp_to_key(self.compareIndexItems))
-
-        # Montando o índice primário.
-        self.primaryIndex.clear()
-        featureId = -1
-        indexItem = None
-        for i, indexItem in enumerate(self.index):
-            if indexItem.featureId != featureId:
-                featureId = indexItem.featureId
-                self.primaryIndex.append(IndexItem(featureId, i))
+        siblingFeatures = {sibling.featureId for sibling in siblings}
+
+        for eventItem in self.adjacency.get(featureId, []):
+            relatedSegment = None
+            if (
+                eventItem.source.featureId == featureId
+                and eventItem.destination.featureId != destFeatureId
+            ):
+                relatedSegment = eventItem.destination
+            elif (
+                eventItem.destination.featureId == featureId
+                and eventItem.source.featureId != destFeatureId
+            ):
+                relatedSegment = eventItem.source
+
+            if relatedSegment and relatedSegment.featureId not in siblingFeatures:
+                result.append(relatedSegment)
+
+        return result
 
     def reportUnexpectedRelations(self, log: Message) -> None:
         log.append(
@@ -250,8 +155,9 @@ class Relation:
             "entretanto foram encontradas as relações:"
         )
 
-        if self.err:
-            for item in self.err:
+        errors = self.sortedErrors()
+        if errors:
+            for item in errors:
                 log.append(
                     f"    - FID {str(item.source.featureId + 1)}"
                     + (
@@ -261,7 +167,7 @@ class Relation:
                     )
                     + f"{item.destination.featureId + 1}"
                 )
-            log.append(f"    Total de relações: {str(len(self.err))}.\n")
+            log.append(f"    Total de relações: {str(len(errors))}.\n")
             log.append(
                 "Consulte a documentação deste aplicativo para mais "
                 "detalhes sobre as relações topológicas esperadas e inesperadas.\n"
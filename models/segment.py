@@ -1,9 +1,11 @@
 from decimal import Decimal
 
-from .vertex import Vertex
+from .vertex import Coordinate, Vertex
 
 
 class Segment:
+    __slots__ = ("segmentId", "featureId", "setId", "a", "b", "isMouth")
+
     def __init__(
         self,
         segmentId: int,
@@ -19,11 +21,11 @@ class Segment:
         self.b = b
         self.isMouth = False
 
-    def getSmallerX(self, tolerance: Decimal) -> Decimal:
+    def getSmallerX(self, tolerance: Decimal) -> Coordinate:
         return self.a.x if self.a.x + tolerance < self.b.x else self.b.x
 
     def isPoint(self, tolerance: Decimal) -> bool:
-        return (
+        return bool(
             abs(self.a.x - self.b.x) <= tolerance
             and abs(self.a.y - self.b.y) <= tolerance
         )
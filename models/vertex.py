@@ -1,12 +1,19 @@
 from decimal import Decimal
+from typing import Any
+
+# Decimal no núcleo exato (Geometry), float no FloatGeometry e int na grade
+# (GridGeometry): o tipo da coordenada depende do núcleo geométrico em uso.
+Coordinate = Any
 
 
 class Vertex:
+    __slots__ = ("vertexId", "x", "y", "last")
+
     def __init__(
         self,
         vertexId: int = -1,
-        x: Decimal = Decimal(0),
-        y: Decimal = Decimal(0),
+        x: Coordinate = Decimal(0),
+        y: Coordinate = Decimal(0),
         last: bool = False,
     ) -> None:
         self.vertexId = vertexId
@@ -15,10 +22,10 @@ class Vertex:
         self.last = last
 
     def equalsTo(self, p: "Vertex") -> bool:
-        return self.x == p.x and self.y == p.y
+        return bool(self.x == p.x and self.y == p.y)
 
-    def withinTolerance(self, otherX: Decimal, tolerance: Decimal) -> bool:
-        return abs(otherX - self.x) <= tolerance
+    def withinTolerance(self, otherX: Coordinate, tolerance: Coordinate) -> bool:
+        return bool(abs(otherX - self.x) <= tolerance)
 
     def isExtremity(self) -> bool:
         return self.vertexId == 0 or self.last
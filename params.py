@@ -14,6 +14,18 @@ class Params:
         shreveOrderEnabled: bool = False,
         monitorPointEnabled: bool = False,
         monitorPointN: int = 5,
+        heapQueueEnabled: bool = True,
+        eventMergeEnabled: bool = False,
+        monotoneChainsEnabled: bool = False,
+        floatGeometryEnabled: bool = False,
+        snapToGridEnabled: bool = False,
+        featureSetCacheEnabled: bool = False,
+        boundaryFilterEnabled: bool = False,
+        basinPartitionEnabled: bool = False,
+        componentPartitionEnabled: bool = False,
+        partitionWorkers: int = 0,
+        sweepSlabs: int = 0,
+        topologyEngine: int = 0,
     ) -> None:
         self.origin = origin
         self.drainageFileName = drainageFileName
@@ -24,3 +36,32 @@ class Params:
         self.shreveOrderEnabled = shreveOrderEnabled
         self.monitorPointEnabled = monitorPointEnabled
         self.monitorPointN = monitorPointN
+        self.heapQueueEnabled = heapQueueEnabled
+        self.floatGeometryEnabled = floatGeometryEnabled
+        # A grade precisa de uma tolerância positiva.
+        self.snapToGridEnabled = snapToGridEnabled and toleranceXY > 0
+        # Eventos gerados feição a feição durante a varredura. A ordem só é
+        # a de Scanner.sortLines com as comparações exatas da grade, e os
+        # eventos de interseção precisam da fila de prioridade.
+        self.eventMergeEnabled = (
+            eventMergeEnabled and self.snapToGridEnabled and heapQueueEnabled
+        )
+        # Segmentos consecutivos de uma feição varridos como cadeias
+        # monótonas em x (Scanner.monotoneChains).
+        self.monotoneChainsEnabled = monotoneChainsEnabled
+        self.featureSetCacheEnabled = featureSetCacheEnabled
+        # Lê só a drenagem dentro da extensão do limite (mais a tolerância).
+        self.boundaryFilterEnabled = boundaryFilterEnabled
+        # Cada polígono do limite (ou cada componente conexa da drenagem) é
+        # classificado em separado por partitionWorkers processos (0 - um
+        # por CPU).
+        self.basinPartitionEnabled = basinPartitionEnabled
+        self.componentPartitionEnabled = componentPartitionEnabled
+        self.partitionWorkers = partitionWorkers
+        # Faixas verticais varridas em paralelo, também por partitionWorkers
+        # processos (0 ou 1 - varredura única).
+        self.sweepSlabs = sweepSlabs
+        # Busca das relações topológicas: 0 - linha de varredura; 1 - pares
+        # candidatos de uma R-tree dos segmentos; 2 - pares de uma grade
+        # uniforme calculada com NumPy.
+        self.topologyEngine = topologyEngine
@@ -0,0 +1,94 @@
+# coding=utf-8
+"""Synthetic drainage networks used by the regression tests."""
+
+import random
+
+from qgis.core import QgsPointXY
+
+from ..models.feature import Feature
+from ..models.feature_set import FeatureSet
+from ..models.observation import Observation
+
+BOUNDARY = [
+    [
+        (0.0, 0.0),
+        (5000.0, 0.0),
+        (5000.0, 5000.0),
+        (-5000.0, 5000.0),
+        (-5000.0, 0.0),
+    ],
+]
+
+
+def drainage_tree(seed, depth, vertices=6, crossing=False):
+    """Binary drainage tree with its mouth at (0, 0).
+
+    Each feature is a polyline from a confluence to the next one, randomly
+    digitized upstream or downstream. When crossing is set, an extra feature
+    crosses the main stem.
+    """
+    rng = random.Random(seed)
+    lines = []
+
+    def branch(x, y, width, level):
+        if level == 0:
+            return
+        for side in (-1, 1):
+            cx, cy = x + side * width / 4, y + 10
+            if level == depth:  # Canal principal.
+                cx = x
+            points = [(x, y)]
+            for k in range(1, vertices - 1):
+                t = k / (vertices - 1)
+                points.append(
+                    (
+                        x + (cx - x) * t + rng.uniform(-0.05, 0.05) * width / 8,
+                        y + (cy - y) * t,
+                    )
+                )
+            points.append((cx, cy))
+            if rng.random() < 0.5:
+                points.reverse()
+            lines.append(points)
+            branch(cx, cy, width / 2, level - 1)
+            if level == depth:
+                break
+
+    branch(0.0, 0.0, 1000.0, depth)
+    if crossing:
+        lines.append([(-200.0, 15.0), (200.0, 16.0)])
+    return lines
+
+
+def boundary_rings():
+    """Boundary polygon ring touching the mouth of drainage_tree."""
+    return [ring + [ring[0]] for ring in BOUNDARY]
+
+
+def build_feature_set(dao, lines, shape_type, polygon=False):
+    """Build a FeatureSet through the DAO vertex and segment parsers."""
+    feature_set = FeatureSet(shape_type, "", 0, Observation(), None)
+    for feature_id, points in enumerate(lines):
+        part = [QgsPointXY(x, y) for x, y in points]
+        feature = Feature(
+            None, featureId=feature_id, sourceId=feature_id, setId=shape_type
+        )
+        feature.vertexList = dao._parse_vertices([part] if polygon else part)
+        feature.segmentsList = dao._parse_segments(
+            shape_type, feature, feature.vertexList
+        )
+        feature_set.featuresList.append(feature)
+    return feature_set
+
+
+def unbranched_river(features):
+    """Single river digitized as a chain of short features from (0, 0)."""
+    return [
+        [(0.1 * (k % 2), 0.05 * k), (0.1 * ((k + 1) % 2), 0.05 * (k + 1))]
+        for k in range(features)
+    ]
+
+
+def shifted(lines, dx):
+    """The same lines moved dx to the right (another basin)."""
+    return [[(x + dx, y) for x, y in points] for points in lines]
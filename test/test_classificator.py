@@ -0,0 +1,208 @@
+# coding=utf-8
+"""Classificator tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = "hruzeda@gmail.com"
+__date__ = "2024-08-07"
+__copyright__ = "Copyright 2024, Henrique Uzêda"
+
+import sys
+import unittest
+
+from ..utils.grid_scanner import numpyAvailable
+from .datasets import boundary_rings, drainage_tree, shifted, unbranched_river
+from .test_geometry import classify
+
+
+class Feedback:
+    """QgsFeedback mínimo: cancela após um número de consultas."""
+
+    def __init__(self, cancelAfter=None):
+        self.cancelAfter = cancelAfter
+        self.checks = 0
+        self.values = []
+
+    def isCanceled(self):
+        self.checks += 1
+        return self.cancelAfter is not None and self.checks > self.cancelAfter
+
+    def setProgress(self, value):
+        self.values.append(value)
+
+
+class ClassificatorTest(unittest.TestCase):
+    """Test the drainage tree construction."""
+
+    def test_deep_river_does_not_recurse(self):
+        """A chain longer than the recursion limit is classified."""
+        features = sys.getrecursionlimit() + 500
+        result, _, classification = classify(unbranched_river(features))
+
+        self.assertEqual(result, 0)
+        self.assertEqual(len(classification), features)
+        self.assertTrue(all(order == (2, 1, 1) for order in classification))
+
+    def test_progress_is_reported(self):
+        """The sweep and the tree build report increasing progress."""
+        lines = drainage_tree(0, 9)
+        feedback = Feedback()
+        self.assertEqual(classify(lines, feedback=feedback), classify(lines))
+
+        self.assertIn(70, feedback.values)
+        self.assertEqual(feedback.values[-1], 85)
+        self.assertEqual(feedback.values, sorted(feedback.values))
+
+    def test_cancel_stops_classification(self):
+        """A cancelled task returns 7 at any phase."""
+        lines = drainage_tree(0, 9)
+        for cancelAfter in (0, 1, 4, 8, 11):
+            result = classify(lines, feedback=Feedback(cancelAfter))[0]
+            self.assertEqual(result, 7)
+
+    def test_basins_are_classified_separately(self):
+        """Each boundary polygon is classified as in a run of its own."""
+        first, second = drainage_tree(0, 7), shifted(drainage_tree(1, 7), 20000)
+        rings = boundary_rings() + shifted(boundary_rings(), 20000)
+        expected = (
+            classify(first)[2]
+            + classify(second, rings=shifted(boundary_rings(), 20000))[2]
+        )
+        self.assertEqual(classify(first + second, rings=rings)[2], expected)
+
+        for workers in (1, 2):
+            result, _, classification = classify(
+                first + second,
+                rings=rings,
+                basinPartitionEnabled=True,
+                partitionWorkers=workers,
+            )
+            self.assertEqual(result, 0)
+            self.assertEqual(classification, expected)
+
+    def test_river_outside_every_basin(self):
+        """Drainage outside the boundary polygons is reported, not classified."""
+        lines = drainage_tree(0, 5) + [[(9000.0, 100.0), (9000.0, 200.0)]]
+        result, _, classification = classify(
+            lines, basinPartitionEnabled=True, partitionWorkers=1
+        )
+        self.assertEqual(result, 1)
+        self.assertEqual(classification[:-1], classify(lines[:-1])[2])
+        self.assertEqual(classification[-1], (0, 0, 0))
+
+    def test_components_match_single_sweep(self):
+        """Sweeping the connected components apart changes nothing."""
+        second = shifted(drainage_tree(1, 6), 20000)
+        rings = boundary_rings() + shifted(boundary_rings(), 20000)
+        for lines in (
+            drainage_tree(0, 7) + second,
+            drainage_tree(2, 5, crossing=True) + second,
+        ):
+            expected = classify(lines, rings=rings)
+            for workers in (1, 2):
+                result, _, classification = classify(
+                    lines,
+                    rings=rings,
+                    componentPartitionEnabled=True,
+                    partitionWorkers=workers,
+                )
+                self.assertEqual(result, expected[0])
+                if result == 0:
+                    self.assertEqual(classification, expected[2])
+
+    def test_slabs_match_single_sweep(self):
+        """Sweeping vertical slabs finds the same relations and orders."""
+        for lines in (
+            drainage_tree(0, 8),
+            drainage_tree(3, 6, crossing=True),
+            unbranched_river(300),
+        ):
+            expected = classify(lines)
+            for slabs, workers in ((3, 1), (8, 1), (4, 2)):
+                self.assertEqual(
+                    classify(lines, sweepSlabs=slabs, partitionWorkers=workers),
+                    expected,
+                )
+
+    def test_merged_events_match_sorted(self):
+        """Generating the grid's events per feature keeps the classification."""
+        for lines in (drainage_tree(0, 8), drainage_tree(3, 6, crossing=True)):
+            self.assertEqual(
+                classify(lines, snapToGridEnabled=True, eventMergeEnabled=True),
+                classify(lines, snapToGridEnabled=True),
+            )
+
+    def test_monotone_chains_match_sweep(self):
+        """Sweeping monotone chains finds the same relations and orders."""
+        for lines, options in (
+            (drainage_tree(0, 9), {}),
+            (drainage_tree(3, 6, crossing=True), {}),
+            (drainage_tree(4, 7), {"floatGeometryEnabled": True}),
+            (drainage_tree(5, 7), {"snapToGridEnabled": True}),
+            (
+                drainage_tree(0, 8),
+                {"snapToGridEnabled": True, "eventMergeEnabled": True},
+            ),
+            (unbranched_river(300), {"sweepSlabs": 3, "partitionWorkers": 1}),
+        ):
+            result, relations, classification = classify(lines, **options)
+            chains = classify(lines, monotoneChainsEnabled=True, **options)
+            self.assertEqual(chains[0], result)
+            self.assertEqual(sorted(chains[1]), sorted(relations))
+            self.assertEqual(chains[2], classification)
+
+        # O rio começa no vértice interno do limite onde a cadeia continua.
+        rings = [
+            [(-5000, 0), (0, 0), (10, 1000), (5000, 5000), (-5000, 5000), (-5000, 0)]
+        ]
+        lines = [[(0, 0), (10, 100)], [(2, 10), (8, 200)]]
+        for result, relations, _ in (
+            classify(lines, rings=rings),
+            classify(lines, rings=rings, monotoneChainsEnabled=True),
+        ):
+            self.assertEqual(result, 5)
+            self.assertEqual(sorted(relations), [(0, 0, 0), (0, 1, 2)])
+
+    def test_rtree_engine_matches_sweep(self):
+        """Candidate pairs from the R-tree give the sweep's relations."""
+        for lines, options in (
+            (drainage_tree(0, 9), {}),
+            (drainage_tree(3, 6, crossing=True), {}),
+            (drainage_tree(4, 7), {"floatGeometryEnabled": True}),
+            (drainage_tree(5, 7), {"snapToGridEnabled": True}),
+        ):
+            result, relations, classification = classify(lines, **options)
+            for workers in (1, 2):
+                engine = classify(
+                    lines, topologyEngine=1, partitionWorkers=workers, **options
+                )
+                self.assertEqual(engine[0], result)
+                self.assertEqual(sorted(engine[1]), sorted(relations))
+                self.assertEqual(engine[2], classification)
+
+    @unittest.skipUnless(numpyAvailable(), "NumPy não instalado")
+    def test_grid_engine_matches_sweep(self):
+        """The NumPy grid filter keeps every pair the sweep relates."""
+        for lines, options in (
+            (drainage_tree(0, 9), {}),
+            (drainage_tree(3, 6, crossing=True), {}),
+            (drainage_tree(4, 7), {"floatGeometryEnabled": True}),
+            (drainage_tree(5, 7), {"snapToGridEnabled": True}),
+            (unbranched_river(300), {}),
+        ):
+            result, relations, classification = classify(lines, **options)
+            engine = classify(lines, topologyEngine=2, **options)
+            self.assertEqual(engine[0], result)
+            self.assertEqual(sorted(engine[1]), sorted(relations))
+            self.assertEqual(engine[2], classification)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(ClassificatorTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,108 @@
+# coding=utf-8
+"""Command-line entry point tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = "hruzeda@gmail.com"
+__date__ = "2024-08-07"
+__copyright__ = "Copyright 2024, Henrique Uzêda"
+
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from decimal import Decimal
+
+from ..cli import batchPartitionWorkers, buildParams, parseArgs, readManifest
+
+
+class CliTest(unittest.TestCase):
+    """Test the argument parsing of the headless entry point."""
+
+    def parse(self, *options):
+        return parseArgs(
+            ["classify", "--drainage", "rios.shp", "--boundary", "bacia.shp"]
+            + ["--out", "saida.shp", *options]
+        )
+
+    def test_params(self):
+        """Options are mapped to the same Params the dialog builds."""
+        params = buildParams(
+            self.parse("--tolerance", "0.5", "--strahler", "--monitor-point", "3")
+        )
+
+        self.assertIsNone(params.origin)
+        self.assertEqual(params.drainageFileName, "rios.shp")
+        self.assertEqual(params.boundaryFileName, "bacia.shp")
+        self.assertEqual(params.newFileName, "saida.shp")
+        self.assertEqual(params.toleranceXY, Decimal("0.5"))
+        self.assertEqual(params.strahlerOrderType, 1)
+        self.assertFalse(params.shreveOrderEnabled)
+        self.assertTrue(params.monitorPointEnabled)
+        self.assertEqual(params.monitorPointN, 3)
+
+    def test_defaults(self):
+        """Without options only the flow is inferred."""
+        params = buildParams(self.parse())
+
+        self.assertEqual(params.toleranceXY, Decimal(0))
+        self.assertEqual(params.strahlerOrderType, 0)
+        self.assertFalse(params.monitorPointEnabled)
+        self.assertFalse(params.snapToGridEnabled)
+
+    def test_negative_tolerance(self):
+        """A negative tolerance is rejected like in the dialog."""
+        with contextlib.redirect_stderr(io.StringIO()):
+            with self.assertRaises(SystemExit):
+                self.parse("--tolerance", "-1")
+
+    def test_merge_events_requires_grid(self):
+        """Event merging is only accepted together with the grid."""
+        with contextlib.redirect_stderr(io.StringIO()):
+            with self.assertRaises(SystemExit):
+                self.parse("--merge-events", "--tolerance", "0.5")
+            with self.assertRaises(SystemExit):
+                self.parse("--merge-events", "--snap-to-grid")
+
+        params = buildParams(
+            self.parse("--merge-events", "--snap-to-grid", "--tolerance", "0.5")
+        )
+        self.assertTrue(params.eventMergeEnabled)
+
+    def test_batch_partition_workers(self):
+        """Batch workers share the CPUs with the per-basin pools."""
+        cpus = os.cpu_count() or 1
+        self.assertEqual(batchPartitionWorkers(3, cpus), 3)
+        self.assertEqual(batchPartitionWorkers(0, 1), cpus)
+        self.assertEqual(batchPartitionWorkers(0, cpus), 1)
+        self.assertEqual(batchPartitionWorkers(0, 2 * cpus), 1)
+
+    def test_manifest(self):
+        """Each manifest row is a basin; required columns are checked."""
+        with tempfile.TemporaryDirectory() as folder:
+            fileName = os.path.join(folder, "bacias.csv")
+            with open(fileName, "w", encoding="utf-8") as manifest:
+                manifest.write("drainage,boundary,out,log\n")
+                manifest.write("a.shp,la.shp,sa.shp,\n")
+                manifest.write("b.shp,lb.shp,sb.shp,b.txt\n")
+            jobs = readManifest(fileName)
+
+            self.assertEqual([job["drainage"] for job in jobs], ["a.shp", "b.shp"])
+            self.assertEqual(jobs[1]["log"], "b.txt")
+
+            with open(fileName, "a", encoding="utf-8") as manifest:
+                manifest.write("c.shp,,sc.shp,\n")
+            with self.assertRaises(ValueError):
+                readManifest(fileName)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(CliTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,124 @@
+# coding=utf-8
+"""Feature set cache tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = "hruzeda@gmail.com"
+__date__ = "2024-08-07"
+__copyright__ = "Copyright 2024, Henrique Uzêda"
+
+import os
+import tempfile
+import unittest
+from decimal import Decimal
+
+from ..models.new_feature_attribute import NewFeatureAttributes
+from ..utils.feature_set_cache import FeatureSetCache
+from ..utils.shp_feature_set_dao import SHPFeatureSetDAO
+from .datasets import build_feature_set, drainage_tree
+
+
+class Layer:
+    """Camada mínima: o cache só consulta o tipo de geometria."""
+
+    def wkbType(self):
+        return 5
+
+
+def snapshot(feature_set):
+    features = feature_set.featuresList + feature_set.newFeaturesList
+    return (
+        [
+            (
+                feature.featureId,
+                feature.sourceId,
+                feature.process,
+                [(v.vertexId, v.x, v.y, v.last) for v in feature.vertexList],
+                [
+                    (s.segmentId, s.featureId, s.a.x, s.a.y, s.b.x, s.b.y)
+                    for s in feature.segmentsList
+                ],
+            )
+            for feature in features
+        ],
+        [(item.featureId, item.text) for item in feature_set.obs.list],
+    )
+
+
+class FeatureSetCacheTest(unittest.TestCase):
+    """Test the binary cache round trip."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.folder = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.folder.name, "drenagem.shp")
+
+    def tearDown(self):
+        """Runs after each test."""
+        self.folder.cleanup()
+
+    def test_round_trip(self):
+        """Vertices and segments are restored exactly."""
+        lines = drainage_tree(1, 5)
+        for floatCoordinates, snapToGrid in (
+            (False, False),
+            (True, False),
+            (False, True),
+        ):
+            dao = SHPFeatureSetDAO(Decimal("0.001"), floatCoordinates, snapToGrid)
+            feature_set = build_feature_set(dao, lines, 0)
+
+            cache = FeatureSetCache(self.filename, dao.mode)
+            cache.save(feature_set, dao.snapToGrid)
+            cached = cache.load(0, Layer(), dao.coordinate)
+
+            self.assertEqual(snapshot(cached), snapshot(feature_set))
+            self.assertEqual(
+                [type(v.x) for v in cached.featuresList[0].vertexList],
+                [type(v.x) for v in feature_set.featuresList[0].vertexList],
+            )
+
+    def test_new_feature_attributes(self):
+        """Attributes shared by the parts of a feature are restored shared."""
+        dao = SHPFeatureSetDAO(Decimal("0.001"))
+        feature_set = build_feature_set(dao, drainage_tree(1, 3), 0)
+        river, lake = ["Rio Doce", 3, 1.5, None], ["Lagoa", 7, 0.25, True]
+        for featureId, attributes in ((10, river), (11, river), (12, lake)):
+            feature_set.newFeaturesAttributes[featureId] = NewFeatureAttributes(
+                featureId=featureId, attributes=attributes
+            )
+
+        cache = FeatureSetCache(self.filename, "a")
+        cache.save(feature_set)
+        cached = cache.load(0, Layer(), Decimal)
+
+        self.assertEqual(cached.getNewFeatureAttributes(10), river)
+        self.assertEqual(cached.getNewFeatureAttributes(12), lake)
+        self.assertIs(
+            cached.getNewFeatureAttributes(10), cached.getNewFeatureAttributes(11)
+        )
+        self.assertIsNone(cached.getNewFeatureAttributes(13))
+
+    def test_key_mismatch(self):
+        """A cache written for other contents or options is ignored."""
+        dao = SHPFeatureSetDAO(Decimal("0.001"))
+        feature_set = build_feature_set(dao, drainage_tree(1, 3), 0)
+        FeatureSetCache(self.filename, "a").save(feature_set)
+
+        self.assertIsNone(
+            FeatureSetCache(self.filename, "b").load(0, Layer(), Decimal)
+        )
+        self.assertIsNone(
+            FeatureSetCache(self.filename + "x", "a").load(0, Layer(), Decimal)
+        )
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(FeatureSetCacheTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,212 @@
+# coding=utf-8
+"""Geometry kernel tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = "hruzeda@gmail.com"
+__date__ = "2024-08-07"
+__copyright__ = "Copyright 2024, Henrique Uzêda"
+
+import random
+import unittest
+from decimal import Decimal
+from fractions import Fraction
+
+from qgis.core import QgsPointXY
+
+from ..basin_classificator import BasinClassificator, ComponentClassificator
+from ..classificator import Classificator
+from ..models.segment import Segment
+from ..models.vertex import Vertex
+from ..params import Params
+from ..utils.geometry import (
+    FloatGeometry,
+    Geometry,
+    GridGeometry,
+    crossProduct,
+    segmentArray,
+)
+from ..utils.grid_scanner import numpyAvailable
+from ..utils.message import Message
+from ..utils.shp_feature_set_dao import SHPFeatureSetDAO
+from .datasets import boundary_rings, build_feature_set, drainage_tree
+
+TOLERANCE = Decimal("0.001")
+
+
+def classify(lines, feedback=None, rings=None, **options):
+    params = Params(
+        origin=None,
+        toleranceXY=TOLERANCE,
+        strahlerOrderType=1,
+        shreveOrderEnabled=True,
+        **options,
+    )
+    dao = SHPFeatureSetDAO(
+        params.toleranceXY, params.floatGeometryEnabled, params.snapToGridEnabled
+    )
+    drainage = build_feature_set(dao, lines, 0)
+    boundary = build_feature_set(dao, rings or boundary_rings(), 1, polygon=True)
+    classifier = Classificator
+    if params.basinPartitionEnabled:
+        classifier = BasinClassificator
+    elif params.componentPartitionEnabled:
+        classifier = ComponentClassificator
+    classificator = classifier(drainage, boundary, params, Message(params), feedback)
+    result = classificator.classifyWaterBasin()
+
+    relations = classificator.topologicalRelations
+    return (
+        result,
+        [
+            (item.source.featureId, item.destination.featureId, item.relationType)
+            for item in relations.sortedItems()
+            + relations.sortedErrors()
+            + relations.mouths
+        ],
+        [
+            (feature.flow, feature.strahler, feature.shreve)
+            for feature in drainage.featuresList
+        ],
+    )
+
+
+class GeometryTest(unittest.TestCase):
+    """Test the float64 and grid kernels against the Decimal kernel."""
+
+    def test_cross_product_sign_is_exact(self):
+        """Nearly collinear points get the exact orientation."""
+        a = Vertex(x=0.5, y=0.5)
+        b = Vertex(x=12.0, y=12.0)
+        for i in range(64):
+            c = Vertex(x=0.5 + i * 2.0**-53, y=0.5)
+            d = Vertex(x=24.0, y=24.0)
+            exact = (Fraction(b.x) - Fraction(a.x)) * (
+                Fraction(d.y) - Fraction(c.y)
+            ) - (Fraction(b.y) - Fraction(a.y)) * (Fraction(d.x) - Fraction(c.x))
+            self.assertEqual(
+                (crossProduct(a, b, c, d) > 0) - (crossProduct(a, b, c, d) < 0),
+                (exact > 0) - (exact < 0),
+            )
+
+    def test_predicates_match_decimal(self):
+        """Intersections and angles agree on random segments."""
+        rng = random.Random(0)
+        geo = Geometry(TOLERANCE)
+        fast = FloatGeometry(TOLERANCE)
+
+        def segment(coordinate):
+            a, b = sorted(
+                [(rng.uniform(0, 100), rng.uniform(0, 100)) for _ in range(2)]
+            )
+            return Segment(
+                0,
+                0,
+                0,
+                Vertex(x=coordinate(a[0]), y=coordinate(a[1])),
+                Vertex(x=coordinate(b[0]), y=coordinate(b[1])),
+            )
+
+        for _ in range(2000):
+            state = rng.getstate()
+            first, second = segment(Decimal), segment(Decimal)
+            rng.setstate(state)
+            fastFirst, fastSecond = segment(float), segment(float)
+
+            point = geo.intersection(first, second)
+            fastPoint = fast.intersection(fastFirst, fastSecond)
+            self.assertEqual(point is None, fastPoint is None)
+            if point and fastPoint:
+                self.assertAlmostEqual(float(point.x), fastPoint.x, places=6)
+                self.assertAlmostEqual(float(point.y), fastPoint.y, places=6)
+
+            self.assertEqual(
+                geo.compareAngles(first, second),
+                fast.compareAngles(fastFirst, fastSecond),
+            )
+
+    @unittest.skipUnless(numpyAvailable(), "NumPy não instalado")
+    def test_batch_intersections_match_scalar(self):
+        """The batch kernel agrees with intersection, near-misses included."""
+        rng = random.Random(1)
+        # A grade arredonda os pontos para o inteiro mais próximo.
+        for geo, coordinate, offset, delta in (
+            (Geometry(TOLERANCE), Decimal, Decimal("7000000.0001"), 1e-6),
+            (FloatGeometry(TOLERANCE), float, 7000000.0, 0),
+            (GridGeometry(), int, 0, 0.5),
+        ):
+            # Vértices em uma grade pequena: muitos toques e colinearidades.
+            segments = [
+                Segment(
+                    0,
+                    0,
+                    0,
+                    *[
+                        Vertex(
+                            x=offset + coordinate(rng.randint(0, 12)) / 4,
+                            y=offset + coordinate(rng.randint(0, 12)) / 4,
+                        )
+                        for _ in range(2)
+                    ],
+                )
+                for _ in range(120)
+            ]
+            if coordinate is int:
+                for segment in segments:
+                    for vertex in (segment.a, segment.b):
+                        vertex.x, vertex.y = int(vertex.x * 4), int(vertex.y * 4)
+
+            pairs = [(i, j) for i in range(120) for j in range(i + 1, 120)]
+            first = [i for i, _ in pairs]
+            second = [j for _, j in pairs]
+            flags, points = geo.intersections(
+                segments, segmentArray(segments), first, second
+            )
+            for k, (i, j) in enumerate(pairs):
+                point = geo.intersection(segments[i], segments[j])
+                self.assertEqual(bool(flags[k]), point is not None)
+                if point and geo.exactBatchPoints:
+                    self.assertEqual(tuple(points[k]), (point.x, point.y))
+                elif point:
+                    self.assertAlmostEqual(points[k][0], float(point.x), delta=delta)
+                    self.assertAlmostEqual(points[k][1], float(point.y), delta=delta)
+
+    def test_relations_match_decimal(self):
+        """Both kernels yield the same relations and classification."""
+        for seed in range(4):
+            for depth in (3, 5, 7):
+                for crossing in (False, True):
+                    lines = drainage_tree(seed, depth, crossing=crossing)
+                    self.assertEqual(
+                        classify(lines), classify(lines, floatGeometryEnabled=True)
+                    )
+
+    def test_grid_relations_match_decimal(self):
+        """Snapping to the tolerance grid keeps relations and classification."""
+        for seed in range(4):
+            for depth in (3, 5, 7):
+                for crossing in (False, True):
+                    lines = drainage_tree(seed, depth, crossing=crossing)
+                    self.assertEqual(
+                        classify(lines), classify(lines, snapToGridEnabled=True)
+                    )
+
+    def test_grid_collapses_close_vertices(self):
+        """Consecutive vertices within one grid cell become a single vertex."""
+        dao = SHPFeatureSetDAO(TOLERANCE, snapToGrid=True)
+        vertices = dao._parse_vertices(
+            [QgsPointXY(0.0, 0.0), QgsPointXY(0.0002, 0.0001), QgsPointXY(1.0, 1.0)]
+        )
+        self.assertEqual([(v.x, v.y) for v in vertices], [(0, 0), (1000, 1000)])
+        self.assertTrue(vertices[-1].last)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(GeometryTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,68 @@
+# coding=utf-8
+"""Relation store tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = "hruzeda@gmail.com"
+__date__ = "2024-08-07"
+__copyright__ = "Copyright 2024, Henrique Uzêda"
+
+import unittest
+
+from ..models.relation import Relation
+from ..models.segment import Segment
+from ..models.vertex import Vertex
+
+
+def segment(featureId, segmentId=0, setId=0):
+    return Segment(segmentId, featureId, setId, Vertex(), Vertex())
+
+
+class RelationTest(unittest.TestCase):
+    """Test the keyed relation store and its adjacency lists."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.relation = Relation(None)
+
+    def test_duplicates_are_ignored(self):
+        """The same feature pair and type is stored once."""
+        self.relation.addRelation(segment(2), segment(1), 0)
+        self.relation.addRelation(segment(1, 3), segment(2, 4), 0)
+        self.relation.addRelation(segment(1), segment(2), 2)
+        self.relation.addRelation(segment(2), segment(1), 2)
+
+        self.assertEqual(len(self.relation.sortedItems()), 1)
+        self.assertEqual(len(self.relation.sortedErrors()), 1)
+        self.assertEqual(self.relation.sortedItems()[0].source.featureId, 1)
+
+    def test_child_segments(self):
+        """Children exclude the parent feature and the siblings."""
+        for a, b in [(0, 1), (1, 3), (1, 2), (2, 4), (2, 5)]:
+            self.relation.addRelation(segment(a), segment(b), 0)
+
+        children = self.relation.findChildSegments(1, 0, [])
+        self.assertEqual([child.featureId for child in children], [2, 3])
+
+        children = self.relation.findChildSegments(1, 0, [segment(3)])
+        self.assertEqual([child.featureId for child in children], [2])
+
+        self.assertEqual(self.relation.findChildSegments(6, 0, []), [])
+
+    def test_single_mouth_per_feature(self):
+        """A drainage feature touching the boundary twice is one mouth."""
+        self.relation.addRelation(segment(0), segment(0, 0, 1), 0)
+        self.relation.addRelation(segment(0, 1), segment(0, 1, 1), 0)
+        self.assertEqual(len(self.relation.mouths), 1)
+        self.assertTrue(self.relation.mouths[0].source.isMouth)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(RelationTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,253 @@
+# coding=utf-8
+"""Scanner event queue tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = "hruzeda@gmail.com"
+__date__ = "2024-08-07"
+__copyright__ = "Copyright 2024, Henrique Uzêda"
+
+import functools
+import itertools
+import random
+import unittest
+from decimal import Decimal
+
+from ..models.feature import Feature
+from ..models.segment import Segment
+from ..models.vertex import Vertex
+from ..utils.geometry import Geometry, GridGeometry
+from ..utils.scanner import ScanLine, Scanner
+
+
+def make_feature(featureId: int, points: list[tuple[int, int]]) -> Feature:
+    vertices = [
+        Vertex(vertexId=i, x=Decimal(x), y=Decimal(y), last=i == len(points) - 1)
+        for i, (x, y) in enumerate(points)
+    ]
+    segments = []
+    for i in range(len(vertices) - 1):
+        a, b = sorted([vertices[i], vertices[i + 1]], key=lambda v: (v.x, v.y))
+        segments.append(Segment(i, featureId, 0, a, b))
+    return Feature(None, featureId=featureId, setId=0, segmentsList=segments)
+
+
+class ScannerTest(unittest.TestCase):
+    """Test the heap event queue against the sorted list."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.features = [
+            make_feature(0, [(0, 0), (4, 4), (8, 0)]),
+            make_feature(1, [(0, 4), (4, 0), (8, 4)]),
+            make_feature(2, [(1, 2), (7, 2)]),
+        ]
+
+    def drain(self, heapQueueEnabled):
+        scanner = Scanner(Geometry(Decimal("0.001")), heapQueueEnabled)
+        scanner.addLines(self.features)
+        scanner.sortLines()
+
+        first = self.features[0].segmentsList[0]
+        second = self.features[1].segmentsList[0]
+        third = self.features[2].segmentsList[0]
+        for segmentA, segmentB in [
+            (first, second),
+            (third, first),
+            (first, second),  # Repetido.
+            (third, second),
+        ]:
+            point = Geometry(Decimal("0.001")).intersection(segmentA, segmentB)
+            scanner.add(ScanLine(point, 2, segmentA, segmentB))
+
+        events = []
+        line = scanner.next()
+        while line is not None:
+            events.append(
+                (
+                    line.eventType,
+                    line.vertex.x,
+                    line.vertex.y,
+                    line.segmentA.featureId,
+                    line.segmentA.segmentId,
+                )
+            )
+            line = scanner.next()
+        return events
+
+    def test_heap_matches_list(self):
+        """Heap and list queues yield the same events in the same order."""
+        self.assertEqual(self.drain(True), self.drain(False))
+
+    def test_sort_key_matches_comparator(self):
+        """The sort key gives the comparator's order, or falls back to it."""
+        rng = random.Random(2)
+        # Sem deslocamento e com grupos mais estreitos que a tolerância, a
+        # chave existe; com grupos encadeados, volta ao comparador.
+        for jitter, keyed in (
+            (Decimal(0), True),
+            (Decimal("0.0004"), True),
+            (Decimal("0.0009"), False),
+        ):
+            features = [
+                make_feature(
+                    i,
+                    [
+                        (rng.randint(0, 20), rng.randint(0, 20))
+                        for _ in range(rng.randint(2, 6))
+                    ],
+                )
+                for i in range(40)
+            ]
+            vertices = {
+                id(vertex): vertex
+                for feature in features
+                for segment in feature.segmentsList
+                for vertex in (segment.a, segment.b)
+            }
+            for vertex in vertices.values():
+                vertex.x += jitter * rng.randint(-1, 1)
+                vertex.y += jitter * rng.randint(-1, 1)
+
+            scanner = Scanner(Geometry(Decimal("0.001")))
+            scanner.addLines(features)
+            expected = sorted(
+                scanner.lines, key=functools.cmp_to_key(scanner.scanLineSorter)
+            )
+            self.assertEqual(scanner.sortOrder() is not None, keyed)
+            scanner.sortLines()
+            self.assertEqual(scanner.lines, expected)
+
+    def test_merged_events_match_sorted(self):
+        """On the grid, merging feature streams keeps the sorted order."""
+        rng = random.Random(3)
+        features = [
+            make_feature(
+                i,
+                [
+                    (rng.randint(0, 30), rng.randint(0, 30))
+                    for _ in range(rng.randint(2, 8))
+                ],
+            )
+            for i in range(40)
+        ]
+        events = []
+        for chains, eventMergeEnabled in itertools.product((False, True), repeat=2):
+            scanner = Scanner(GridGeometry(), True, eventMergeEnabled, chains)
+            scanner.addLines(features[:25])
+            scanner.addLines(features[25:])
+            scanner.sortLines()
+            self.assertEqual(
+                scanner.eventCount,
+                sum(len(scanner.featureLines(feature)) for feature in features),
+            )
+            base = 0
+            for feature in features:
+                lines = scanner.featureLines(feature)
+                self.assertEqual(
+                    scanner.firstEventKey(feature, base),
+                    min(scanner.eventKeys(lines, base)),
+                )
+                base += 2 * len(feature.segmentsList)
+            lines = []
+            line = scanner.next()
+            while line is not None:
+                lines.append(
+                    (
+                        line.eventType,
+                        line.segmentA.featureId,
+                        line.segmentA.segmentId,
+                    )
+                )
+                line = scanner.next()
+            events.append(lines)
+        self.assertEqual(events[0], events[1])
+        self.assertEqual(events[2], events[3])
+
+    def test_monotone_chains(self):
+        """Chain vertices get a single end event carrying the next segment."""
+        feature = make_feature(
+            0, [(0, 0), (2, 1), (4, 0), (3, 3), (1, 4), (1, 6), (5, 6), (9, 8)]
+        )
+        scanner = Scanner(Geometry(Decimal("0.001")), monotoneChainsEnabled=True)
+        chains = scanner.monotoneChains(feature.segmentsList)
+        self.assertEqual(
+            [[segment.segmentId for segment in chain] for chain in chains],
+            [[0, 1], [3, 2], [4], [5, 6]],
+        )
+
+        scanner.addLines([feature])
+        self.assertEqual(scanner.eventCount, 11)
+        ends = [
+            (line.segmentA.segmentId, line.segmentB.segmentId)
+            for line in scanner.lines
+            if line.segmentB
+        ]
+        self.assertEqual(ends, [(0, 1), (3, 2), (5, 6)])
+        for line in scanner.lines:
+            if line.segmentB:
+                self.assertIs(line.vertex, line.segmentB.a)
+
+    def test_chain_order_matches_segments(self):
+        """Chains keep the per-segment order, or split back into it."""
+        rng = random.Random(5)
+        for jitter, keyed in ((Decimal("0.0004"), True), (Decimal("0.0009"), False)):
+            features = [
+                make_feature(
+                    i,
+                    [
+                        (rng.randint(0, 20), rng.randint(0, 20))
+                        for _ in range(rng.randint(2, 6))
+                    ],
+                )
+                for i in range(40)
+            ]
+            vertices = {
+                id(vertex): vertex
+                for feature in features
+                for segment in feature.segmentsList
+                for vertex in (segment.a, segment.b)
+            }
+            for vertex in vertices.values():
+                vertex.x += jitter * rng.randint(-1, 1)
+                vertex.y += jitter * rng.randint(-1, 1)
+
+            events = []
+            for monotoneChainsEnabled in (False, True):
+                scanner = Scanner(
+                    Geometry(Decimal("0.001")),
+                    monotoneChainsEnabled=monotoneChainsEnabled,
+                )
+                scanner.addLines(features)
+                following = {line.segmentB for line in scanner.lines}
+                self.assertEqual(scanner.sortOrder() is not None, keyed)
+                scanner.sortLines()
+                events.append(
+                    [(line.eventType, line.segmentA) for line in scanner.lines]
+                )
+
+            # Com a chave, os inícios omitidos nas cadeias faltam; sem ela, as
+            # cadeias são desfeitas.
+            expected = [
+                (eventType, segment)
+                for eventType, segment in events[0]
+                if not keyed or eventType == 1 or segment not in following
+            ]
+            self.assertEqual(events[1], expected)
+            self.assertEqual(keyed, any(line.segmentB for line in scanner.lines))
+
+    def test_heap_ignores_duplicates(self):
+        """A pending intersection is only scheduled once."""
+        events = self.drain(True)
+        self.assertEqual(len([e for e in events if e[0] == 2]), 3)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(ScannerTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
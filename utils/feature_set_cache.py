@@ -0,0 +1,292 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+from array import array
+from decimal import Decimal
+from typing import Any, Callable, Optional
+
+from PyQt5.QtCore import Qt
+from qgis.core import QgsGeometry, QgsVectorLayer
+
+from ..models.feature import Feature
+from ..models.feature_set import FeatureSet
+from ..models.new_feature_attribute import NewFeatureAttributes
+from ..models.observation import Observation
+from ..models.segment import Segment
+from ..models.vertex import Coordinate, Vertex
+
+MAGIC = b"HFC1"
+VERSION = 4
+HEADER = struct.Struct("<4sQ")  # Assinatura e tamanho do cabeçalho JSON.
+ALIGNMENT = 8
+
+
+def cacheKey(filename: str, shape_type: int, mode: str) -> str:
+    """
+    Chave do cache: hash do conteúdo do .shp e do .dbf, do tipo do conjunto
+    e das opções que mudam a leitura (modo das coordenadas e tolerância).
+    """
+    digest = hashlib.sha256(f"{VERSION}:{shape_type}:{mode}".encode("utf-8"))
+    base = os.path.splitext(filename)[0]
+    for path in (filename, base + ".dbf"):
+        if not os.path.exists(path):
+            continue
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def jsonValue(value: Any) -> Any:
+    """
+    Valor de atributo gravável em JSON. Datas viram texto ISO, que o
+    QgsVectorFileWriter converte de volta ao gravar o resultado.
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if hasattr(value, "isNull") and value.isNull():  # NULL do QGIS.
+        return None
+    if hasattr(value, "toString"):
+        return value.toString(Qt.ISODate)
+    return str(value)
+
+
+class FeatureSetCache:
+    """
+    Cache binário de um FeatureSet já lido, gravado ao lado do arquivo de
+    entrada (<arquivo>.hfc). As colunas de vértices, segmentos e feições
+    são arrays tipados lidos por mmap, sem passar por layer.getFeatures.
+    """
+
+    def __init__(self, filename: str, key: str) -> None:
+        self.filename = filename
+        self.path = filename + ".hfc"
+        self.key = key
+
+    def load(
+        self,
+        shape_type: int,
+        layer: QgsVectorLayer,
+        coordinate: Callable[[Any], Coordinate],
+    ) -> Optional[FeatureSet]:
+        try:
+            with open(self.path, "rb") as file:
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    return self._read(data, shape_type, layer, coordinate)
+        except (OSError, ValueError, KeyError, struct.error):
+            return None
+
+    def _read(
+        self,
+        data: mmap.mmap,
+        shape_type: int,
+        layer: QgsVectorLayer,
+        coordinate: Callable[[Any], Coordinate],
+    ) -> Optional[FeatureSet]:
+        magic, size = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            return None
+        header = json.loads(bytes(data[HEADER.size : HEADER.size + size]))
+        if header["key"] != self.key:
+            return None
+
+        view = memoryview(data)
+        columns = {}
+        for name, (offset, typecode, length) in header["sections"].items():
+            columns[name] = view[offset : offset + length].cast(typecode)
+
+        try:
+            return self._build(header, columns, shape_type, layer, coordinate)
+        finally:
+            # O mmap só pode ser fechado sem views abertas.
+            for column in columns.values():
+                column.release()
+            view.release()
+
+    def _build(
+        self,
+        header: dict[str, Any],
+        columns: dict[str, memoryview],
+        shape_type: int,
+        layer: QgsVectorLayer,
+        coordinate: Callable[[Any], Coordinate],
+    ) -> FeatureSet:
+        obs = Observation()
+        for featureId, text in header["obs"]:
+            obs.set_value(featureId, text)
+
+        feature_set = FeatureSet(
+            shape_type, self.filename, layer.wkbType(), obs, layer
+        )
+
+        # Colunas convertidas de uma vez; na grade as coordenadas já são
+        # inteiras.
+        x: list[Coordinate]
+        y: list[Coordinate]
+        x, y = columns["x"].tolist(), columns["y"].tolist()
+        if columns["x"].format == "d" and coordinate is not float:
+            x, y = list(map(coordinate, x)), list(map(coordinate, y))
+        vertexId = columns["vertexId"].tolist()
+        last = columns["last"].tolist()
+        vertexStart = columns["vertexStart"].tolist()
+        segmentStart = columns["segmentStart"].tolist()
+        segmentId = columns["segmentId"].tolist()
+        segmentFeatureId = columns["segmentFeatureId"].tolist()
+        a, b = columns["a"].tolist(), columns["b"].tolist()
+        wkbStart = columns["wkbStart"].tolist()
+        wkb = columns["wkb"]
+        flags = columns["flags"].tolist()
+        newFeature = columns["newFeature"].tolist()
+        featureType = columns["featureType"].tolist()
+        sourceId = columns["sourceId"].tolist()
+
+        vertices = [
+            Vertex(vertexId=vertexId[j], x=x[j], y=y[j], last=bool(last[j]))
+            for j in range(len(vertexId))
+        ]
+
+        for i, featureId in enumerate(columns["featureId"].tolist()):
+            geometry = QgsGeometry()
+            if wkbStart[i] < wkbStart[i + 1]:
+                geometry.fromWkb(bytes(wkb[wkbStart[i] : wkbStart[i + 1]]))
+
+            feature = Feature(
+                geometry,
+                featureId=featureId,
+                sourceId=sourceId[i],
+                setId=shape_type,
+                featureType=featureType[i],
+                vertexList=vertices[vertexStart[i] : vertexStart[i + 1]],
+                process=bool(flags[i] & 1),
+                hasObservation=bool(flags[i] & 2),
+            )
+
+            for j in range(segmentStart[i], segmentStart[i + 1]):
+                segment = Segment(
+                    segmentId=segmentId[j],
+                    featureId=segmentFeatureId[j],
+                    setId=shape_type,
+                    a=vertices[a[j]],
+                    b=vertices[b[j]],
+                )
+                feature.segmentsList.append(segment)
+
+            if newFeature[i]:
+                feature_set.newFeaturesList.append(feature)
+            else:
+                feature_set.featuresList.append(feature)
+
+        values = header["attributes"]["values"]
+        for featureId, index in header["attributes"]["features"]:
+            feature_set.newFeaturesAttributes[featureId] = NewFeatureAttributes(
+                featureId=featureId, attributes=values[index]
+            )
+
+        return feature_set
+
+    def save(self, feature_set: FeatureSet, grid: bool = False) -> None:
+        coordinate = "q" if grid else "d"
+        columns: dict[str, array[Any]] = {
+            "featureId": array("q"),
+            "sourceId": array("q"),
+            "featureType": array("q"),
+            "flags": array("b"),
+            "newFeature": array("b"),
+            "vertexStart": array("q", [0]),
+            "segmentStart": array("q", [0]),
+            "wkbStart": array("q", [0]),
+            "x": array(coordinate),
+            "y": array(coordinate),
+            "vertexId": array("q"),
+            "last": array("b"),
+            "segmentId": array("q"),
+            "segmentFeatureId": array("q"),
+            "a": array("q"),
+            "b": array("q"),
+            "wkb": array("B"),
+        }
+        # Na ordem de leitura (featureId).
+        features = sorted(
+            [(f, 0) for f in feature_set.featuresList]
+            + [(f, 1) for f in feature_set.newFeaturesList],
+            key=lambda item: item[0].featureId,
+        )
+        for feature, newFeature in features:
+            columns["featureId"].append(feature.featureId)
+            columns["sourceId"].append(feature.sourceId)
+            columns["featureType"].append(int(feature.featureType))
+            columns["flags"].append(
+                int(feature.process) | int(feature.hasObservation) << 1
+            )
+            columns["newFeature"].append(newFeature)
+
+            # Vértices: o índice global de cada vértice da feição.
+            index = {}
+            for vertex in feature.vertexList:
+                index[id(vertex)] = len(columns["vertexId"])
+                columns["x"].append(
+                    int(vertex.x) if grid else float(Decimal(vertex.x))
+                )
+                columns["y"].append(
+                    int(vertex.y) if grid else float(Decimal(vertex.y))
+                )
+                columns["vertexId"].append(vertex.vertexId)
+                columns["last"].append(vertex.last)
+            columns["vertexStart"].append(len(columns["vertexId"]))
+
+            for segment in feature.segmentsList:
+                columns["segmentId"].append(segment.segmentId)
+                columns["segmentFeatureId"].append(segment.featureId)
+                columns["a"].append(index[id(segment.a)])
+                columns["b"].append(index[id(segment.b)])
+            columns["segmentStart"].append(len(columns["segmentId"]))
+
+            # Geometria original, usada na gravação do resultado.
+            if feature.geometry is not None:
+                columns["wkb"].frombytes(bytes(feature.geometry.asWkb()))
+            columns["wkbStart"].append(len(columns["wkb"]))
+
+        header: dict[str, Any] = {
+            "key": self.key,
+            "obs": [[item.featureId, item.text] for item in feature_set.obs.list],
+            "attributes": {"values": [], "features": []},
+            "sections": {},
+        }
+
+        # Listas de atributos compartilhadas entre partes são gravadas uma vez.
+        shared: dict[int, int] = {}
+        for reg in feature_set.newFeaturesAttributes.values():
+            if id(reg.attributes) not in shared:
+                shared[id(reg.attributes)] = len(header["attributes"]["values"])
+                header["attributes"]["values"].append(
+                    [jsonValue(value) for value in reg.attributes]
+                )
+            header["attributes"]["features"].append(
+                [reg.featureId, shared[id(reg.attributes)]]
+            )
+
+        # As seções começam após o cabeçalho, alinhadas a 8 bytes. O tamanho
+        # do cabeçalho depende dos deslocamentos, então é reservado antes.
+        sizes = [len(column) * column.itemsize for column in columns.values()]
+        reserve = len(json.dumps(header)) + 64 * len(columns) + 64
+        offset = HEADER.size + reserve
+        for (name, column), size in zip(columns.items(), sizes):
+            offset += -offset % ALIGNMENT
+            header["sections"][name] = [offset, column.typecode, size]
+            offset += size
+        encoded = json.dumps(header).encode("utf-8").ljust(reserve)
+
+        temp = self.path + ".tmp"
+        try:
+            with open(temp, "wb") as file:
+                file.write(HEADER.pack(MAGIC, reserve))
+                file.write(encoded)
+                for name, column in columns.items():
+                    file.seek(header["sections"][name][0])
+                    column.tofile(file)
+            os.replace(temp, self.path)
+        except OSError:  # Pasta sem permissão de escrita: segue sem cache.
+            if os.path.exists(temp):
+                os.remove(temp)
@@ -1,12 +1,84 @@
+import sys
 from decimal import Decimal
+from fractions import Fraction
 from math import sqrt
-from typing import Optional
+from typing import Any, Optional
 
 from ..models.segment import Segment
 from ..models.vertex import Vertex
 
+try:
+    import numpy as np
+except ImportError:  # O QGIS inclui o NumPy; fora dele, é opcional.
+    np = None  # type: ignore[assignment]
+
+# Limite de erro do predicado orient2d de Shewchuk para float64.
+EPSILON = sys.float_info.epsilon / 2
+CCW_ERRBOUND_A = (3.0 + 16.0 * EPSILON) * EPSILON
+
+# Folga dos parâmetros s e t em Geometry.intersections.
+SLACK = 1e-12
+
+
+def crossProduct(a: Vertex, b: Vertex, c: Vertex, d: Vertex) -> float:
+    """
+    Produto vetorial (b - a) x (d - c) com sinal exato.
+    Calculado em float64; se o resultado estiver dentro do limite de erro,
+    é recalculado de forma exata com frações.
+    """
+    left = (b.x - a.x) * (d.y - c.y)
+    right = (b.y - a.y) * (d.x - c.x)
+    det = left - right
+
+    errBound = CCW_ERRBOUND_A * (abs(left) + abs(right))
+    if det > errBound or -det > errBound:
+        return float(det)
+
+    exact = (Fraction(b.x) - Fraction(a.x)) * (Fraction(d.y) - Fraction(c.y)) - (
+        Fraction(b.y) - Fraction(a.y)
+    ) * (Fraction(d.x) - Fraction(c.x))
+    return float(exact)
+
+
+def segmentArray(segments: list[Segment]) -> Any:
+    """Coordenadas (a.x, a.y, b.x, b.y) dos segmentos, em float64."""
+    coordinates = [
+        (float(s.a.x), float(s.a.y), float(s.b.x), float(s.b.y)) for s in segments
+    ]
+    return np.array(coordinates, dtype=np.float64).reshape(-1, 4)
+
+
+def batchDifference(p: Any, q: Any) -> tuple[Any, Any]:
+    """
+    p - q em lote, com o limite de erro: o arredondamento das coordenadas
+    na conversão para float64 e o da subtração.
+    """
+    return p - q, 2 * EPSILON * (np.abs(p) + np.abs(q))
+
+
+def batchCross(
+    u: tuple[Any, Any], v: tuple[Any, Any], w: tuple[Any, Any], z: tuple[Any, Any]
+) -> tuple[Any, Any]:
+    """u * v - w * z em lote; cada termo é um par (valor, erro)."""
+    left, leftError = batchProduct(u, v)
+    right, rightError = batchProduct(w, z)
+    value = left - right
+    return value, (leftError + rightError + EPSILON * np.abs(value)) * 1.01
+
+
+def batchProduct(u: tuple[Any, Any], v: tuple[Any, Any]) -> tuple[Any, Any]:
+    value = u[0] * v[0]
+    error = (
+        np.abs(u[0]) * v[1] + np.abs(v[0]) * u[1] + u[1] * v[1]
+    ) + EPSILON * np.abs(value)
+    return value, error
+
 
 class Geometry:
+    # Os pontos de intersections são os mesmos de intersection, e não
+    # aproximações em float64.
+    exactBatchPoints = False
+
     def __init__(self, tolerance: Decimal = Decimal(0)) -> None:
         self.tolerance = tolerance
 
@@ -53,6 +125,66 @@ class Geometry:
                 return Vertex(x=a.x + (s * (b.x - a.x)), y=a.y + (s * (b.y - a.y)))
         return None
 
+    def intersections(
+        self, segments: list[Segment], coordinates: Any, first: Any, second: Any
+    ) -> tuple[Any, Any]:
+        """
+        intersection em lote, com NumPy, para os pares de índices
+        (first[k], second[k]) de segments; coordinates vem de segmentArray.
+        Retorna as marcas de interseção e os pontos (float64, nan quando não
+        há). O determinante e os parâmetros s e t são avaliados em float64
+        com os seus limites de erro; os pares que o float64 não decide
+        passam pela intersection de cada núcleo.
+        """
+        ax, ay, bx, by = coordinates[first].T
+        cx, cy, dx, dy = coordinates[second].T
+        abx, aby = batchDifference(bx, ax), batchDifference(by, ay)
+        cdx, cdy = batchDifference(dx, cx), batchDifference(dy, cy)
+        acx, acy = batchDifference(cx, ax), batchDifference(cy, ay)
+
+        det, detError = batchCross(cdx, aby, cdy, abx)
+        sNum, sError = batchCross(cdx, acy, cdy, acx)
+        tNum, tError = batchCross(abx, acy, aby, acx)
+        size = np.abs(det)
+        margin = size - detError
+        low, high = -float(self.tolerance), 1 + float(self.tolerance)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            s = sNum / det
+            t = tNum / det
+            # Intervalos de s e t, só quando o sinal de det é certo.
+            sError = np.where(
+                margin > 0, (sError + np.abs(s) * detError) / margin, np.inf
+            ) + (EPSILON * np.abs(s) + SLACK)
+            tError = np.where(
+                margin > 0, (tError + np.abs(t) * detError) / margin, np.inf
+            ) + (EPSILON * np.abs(t) + SLACK)
+            inside = (
+                (margin > -low)
+                & (s - sError > low)
+                & (s + sError < high)
+                & (t - tError > low)
+                & (t + tError < high)
+            )
+            outside = (
+                (size + detError <= -low)
+                | (s + sError < low)
+                | (s - sError > high)
+                | (t + tError < low)
+                | (t - tError > high)
+            )
+            points = np.full((len(first), 2), np.nan)
+            points[inside, 0] = (ax + s * abx[0])[inside]
+            points[inside, 1] = (ay + s * aby[0])[inside]
+
+        flags = inside.copy()
+        for k in np.nonzero(~inside & ~outside)[0].tolist():
+            point = self.intersection(segments[first[k]], segments[second[k]])
+            if point:
+                flags[k] = True
+                points[k] = float(point.x), float(point.y)
+        return flags, points
+
     def calculateRelativePoint(self, x: Decimal, segment: Segment) -> Vertex:
         # o segmento é vertical. Retorna o vértice com o menor "y"!
         if segment.isVertical(self.tolerance) or segment.a.withinTolerance(
@@ -98,3 +230,111 @@ class Geometry:
 
     def subtract(self, a: Vertex, b: Vertex) -> Vertex:
         return Vertex(x=a.x - b.x, y=a.y - b.y)
+
+
+class FloatGeometry(Geometry):
+    """
+    Núcleo geométrico em float64 (Params.floatGeometryEnabled).
+    Os vértices devem ser carregados como float; os sinais dos determinantes
+    usam o predicado adaptativo crossProduct.
+    """
+
+    exactBatchPoints = True
+
+    def __init__(self, tolerance: Any = 0.0) -> None:
+        super().__init__(float(tolerance))  # type: ignore[arg-type]
+        self.squaredTolerance = self.tolerance * self.tolerance
+
+    def equalsTo(self, a: Vertex, b: Vertex) -> bool:
+        dx = b.x - a.x
+        dy = b.y - a.y
+        return bool(dx * dx + dy * dy <= self.squaredTolerance)
+
+    def intersection(self, primeiro: Segment, segundo: Segment) -> Optional[Vertex]:
+        a = primeiro.a
+        b = primeiro.b
+        c = segundo.a
+        d = segundo.b
+
+        # det = (d.x - c.x) * (b.y - a.y) - (d.y - c.y) * (b.x - a.x)
+        det = -crossProduct(a, b, c, d)
+
+        if abs(det) > self.tolerance:
+            s = ((d.x - c.x) * (c.y - a.y) - (d.y - c.y) * (c.x - a.x)) / det
+            t = ((b.x - a.x) * (c.y - a.y) - (b.y - a.y) * (c.x - a.x)) / det
+
+            if -self.tolerance < s < 1 + self.tolerance and (
+                -self.tolerance < t < 1 + self.tolerance
+            ):
+                return Vertex(x=a.x + (s * (b.x - a.x)), y=a.y + (s * (b.y - a.y)))
+        return None
+
+    def compareAngles(self, first: Segment, second: Segment) -> int:
+        comp = crossProduct(first.a, first.b, second.a, second.b)
+
+        if comp < 0:
+            return 1
+        return -1 if comp > 0 else 0
+
+
+class GridGeometry(Geometry):
+    """
+    Núcleo geométrico para coordenadas inteiras em múltiplos da tolerância
+    (Params.snapToGridEnabled). Como a tolerância já foi aplicada na grade,
+    as comparações são exatas e as interseções são arredondadas para a grade.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(Decimal(0))
+
+    def smallerThan(self, a: Any, b: Any) -> bool:
+        return bool(a < b)
+
+    def greaterThan(self, a: Any, b: Any) -> bool:
+        return bool(a > b)
+
+    def equalsTo(self, a: Vertex, b: Vertex) -> bool:
+        return bool(a.x == b.x and a.y == b.y)
+
+    def posEqualsTo(self, a: Any, b: Any) -> bool:
+        return bool(a == b)
+
+    def intersection(self, primeiro: Segment, segundo: Segment) -> Optional[Vertex]:
+        a = primeiro.a
+        b = primeiro.b
+        c = segundo.a
+        d = segundo.b
+
+        # Na grade as coordenadas são inteiras, e as contas abaixo são exatas.
+        det: int = (d.x - c.x) * (b.y - a.y) - (d.y - c.y) * (b.x - a.x)
+        if det == 0:
+            return None
+
+        # s = sNum / det e t = tNum / det, avaliados sem divisão.
+        sNum: int = (d.x - c.x) * (c.y - a.y) - (d.y - c.y) * (c.x - a.x)
+        tNum: int = (b.x - a.x) * (c.y - a.y) - (b.y - a.y) * (c.x - a.x)
+        if det < 0:
+            det, sNum, tNum = -det, -sNum, -tNum
+
+        if 0 <= sNum <= det and 0 <= tNum <= det:
+            return Vertex(
+                x=a.x + self.roundDivision(sNum * (b.x - a.x), det),
+                y=a.y + self.roundDivision(sNum * (b.y - a.y), det),
+            )
+        return None
+
+    def calculateRelativePoint(self, x: Any, segment: Segment) -> Vertex:
+        if segment.a.x == x or segment.a.x == segment.b.x:
+            return Vertex(x=segment.a.x, y=segment.a.y)
+        if segment.b.x == x:
+            return Vertex(x=segment.b.x, y=segment.b.y)
+
+        # y fica como fração exata das coordenadas inteiras da grade.
+        rise: int = (x - segment.a.x) * (segment.b.y - segment.a.y)
+        run: int = segment.b.x - segment.a.x
+        y = segment.a.y + Fraction(rise, run)
+        return Vertex(x=x, y=y)
+
+    def roundDivision(self, numerator: int, denominator: int) -> int:
+        # Arredonda numerator / denominator para o inteiro mais próximo.
+        return (2 * numerator + denominator) // (2 * denominator)
@@ -0,0 +1,151 @@
+from typing import Any, Optional
+
+from ..models.segment import Segment
+from ..models.vertex import Vertex
+from .geometry import Geometry, segmentArray
+from .pair_scanner import PairScanner
+
+try:
+    import numpy as np
+except ImportError:  # O QGIS inclui o NumPy; fora dele, é opcional.
+    np = None  # type: ignore[assignment]
+
+# Segmentos que cobrem mais células que isto são testados à parte, contra
+# todos os retângulos, em vez de repetidos em cada célula.
+MAX_CELLS = 64
+
+
+def numpyAvailable() -> bool:
+    return np is not None
+
+
+class GridScanner(PairScanner):
+    """
+    Variante de PairScanner com os pares candidatos vindos de uma grade
+    uniforme, calculada com NumPy: cada segmento é registrado nas células
+    que o seu retângulo cobre, e os pares saem das células em operações
+    sobre arrays. As interseções dos pares são testadas em lote por
+    Geometry.intersections.
+    """
+
+    def __init__(self, geo: Geometry, segments: list[Segment], workers: int = 1):
+        super().__init__(geo, segments, workers)
+        self.coordinates = segmentArray(segments)
+
+    def intersections(self) -> list[tuple[int, int, Vertex]]:
+        first, second = self.dropTouching(*self.candidatePairs())
+        geo = self.geo
+        flags, points = geo.intersections(
+            self.segments, self.coordinates, first, second
+        )
+
+        result = []
+        for k in np.nonzero(flags)[0].tolist():
+            i, j = int(first[k]), int(second[k])
+            a, b = self.segments[i], self.segments[j]
+            point: Optional[Vertex]
+            if geo.exactBatchPoints:
+                x, y = points[k].tolist()
+                point = Vertex(x=x, y=y)
+            else:
+                point = geo.intersection(a, b)
+            if point is not None and not (
+                (geo.equalsTo(point, a.a) or geo.equalsTo(point, a.b))
+                and (geo.equalsTo(point, b.a) or geo.equalsTo(point, b.b))
+            ):
+                result.append((i, j, point))
+        return result
+
+    def boxes(self) -> Any:
+        ax, ay, bx, by = self.coordinates.T
+        box = np.stack(
+            [
+                np.minimum(ax, bx),
+                np.minimum(ay, by),
+                np.maximum(ax, bx),
+                np.maximum(ay, by),
+            ],
+            axis=1,
+        )
+        scale = np.maximum(1.0, np.abs(box).max(axis=1, initial=0.0))
+        pad = self.cell + 1e-9 * scale
+        box[:, :2] -= pad[:, None]
+        box[:, 2:] += pad[:, None]
+        return box
+
+    def candidatePairs(self) -> tuple[Any, Any]:
+        """Pares (i < j) de segmentos com retângulos na mesma célula."""
+        count = len(self.segments)
+        box = self.boxes()
+        if count < 2:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty
+
+        # Célula do tamanho típico de um segmento (mediana da maior dimensão).
+        extent = np.maximum(box[:, 2] - box[:, 0], box[:, 3] - box[:, 1])
+        size = float(np.median(extent)) or 1.0
+        origin = box[:, :2].min(axis=0)
+        low = np.floor((box[:, :2] - origin) / size).astype(np.int64)
+        high = np.floor((box[:, 2:] - origin) / size).astype(np.int64)
+        span = high - low + 1
+        cells = span[:, 0] * span[:, 1]
+
+        long = cells > MAX_CELLS
+        short = np.nonzero(~long)[0]
+
+        # Uma entrada (célula, segmento) para cada célula coberta.
+        ids = np.repeat(short, cells[short])
+        offset = np.arange(len(ids)) - np.repeat(
+            np.cumsum(cells[short]) - cells[short], cells[short]
+        )
+        cx = low[ids, 0] + offset % span[ids, 0]
+        cy = low[ids, 1] + offset // span[ids, 0]
+        key = cx * (int(high[:, 1].max()) + 1) + cy
+        order = np.lexsort((ids, key))
+        key, ids = key[order], ids[order]
+
+        # Pares da mesma célula: elementos a d posições um do outro.
+        first, second = [], []
+        d = 1
+        while d < len(key):
+            same = np.nonzero(key[d:] == key[:-d])[0]
+            if len(same) == 0:
+                break
+            first.append(ids[same])
+            second.append(ids[same + d])
+            d += 1
+
+        # Segmentos longos: contra todos os retângulos.
+        for i in np.nonzero(long)[0]:
+            touch = np.nonzero(
+                (box[:, 0] <= box[i, 2])
+                & (box[i, 0] <= box[:, 2])
+                & (box[:, 1] <= box[i, 3])
+                & (box[i, 1] <= box[:, 3])
+            )[0]
+            touch = touch[touch != i]
+            first.append(np.full(len(touch), i))
+            second.append(touch)
+
+        if not first:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty
+
+        a, b = np.concatenate(first), np.concatenate(second)
+        pairs = np.unique(np.minimum(a, b) * count + np.maximum(a, b))
+        return pairs // count, pairs % count
+
+    def dropTouching(self, first: Any, second: Any) -> tuple[Any, Any]:
+        """
+        Descarta os pares com uma extremidade comum: a única interseção
+        possível é ela, que só encosta.
+        """
+        ax, ay, bx, by = self.coordinates[first].T
+        cx, cy, dx, dy = self.coordinates[second].T
+        shared = (
+            ((ax == cx) & (ay == cy))
+            | ((ax == dx) & (ay == dy))
+            | ((bx == cx) & (by == cy))
+            | ((bx == dx) & (by == dy))
+        )
+        return first[~shared], second[~shared]
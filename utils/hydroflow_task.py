@@ -0,0 +1,50 @@
+import traceback
+from typing import Callable
+
+from qgis.core import Qgis, QgsFeedback, QgsMessageLog, QgsTask
+
+
+class HydroflowTask(QgsTask):
+    """
+    Executa uma etapa do processamento fora da thread da interface.
+    A função recebe o QgsFeedback da tarefa, por onde reporta o progresso
+    e verifica o cancelamento; o código retornado é entregue a onFinished
+    na thread da interface.
+    """
+
+    def __init__(
+        self,
+        description: str,
+        function: Callable[[QgsFeedback], int],
+        onFinished: Callable[[int], None],
+    ) -> None:
+        super().__init__(description, QgsTask.CanCancel)
+        self.function = function
+        self.onFinished = onFinished
+        self.feedback = QgsFeedback()
+        self.feedback.progressChanged.connect(self.setProgress)
+        self.result = 0
+        self.error = ""
+
+    def run(self) -> bool:
+        try:
+            self.result = self.function(self.feedback)
+        except Exception:  # pylint: disable=broad-exception-caught
+            self.error = traceback.format_exc()
+            return False
+        return True
+
+    def cancel(self) -> None:
+        self.feedback.cancel()
+        super().cancel()
+
+    def finished(self, result: bool) -> None:
+        if result:
+            self.onFinished(self.result)
+        elif self.error:
+            QgsMessageLog.logMessage(
+                self.error, "Hydroflow", Qgis.MessageLevel.Critical, True
+            )
+            self.onFinished(5)  # Erro inesperado.
+        else:  # Cancelada antes de iniciar.
+            self.onFinished(6)
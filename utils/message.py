@@ -65,6 +65,13 @@ class Message:
             "----------------------------------------------------"
         )
 
+    def save(self, fileName: str) -> None:
+        with open(fileName, "w", encoding="utf-8") as logFile:
+            logFile.write(self.getHeader() + "\n")
+            for item in self.list:
+                logFile.write(item + "\n")
+            logFile.write(self.getFooter() + "\n")
+
     def hasMessages(self) -> bool:
         return len(self.list) > 0
 
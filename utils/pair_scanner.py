@@ -0,0 +1,132 @@
+import math
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Optional
+
+from ..models.segment import Segment
+from ..models.vertex import Vertex
+from .geometry import Geometry
+from .process_pool import poolContext
+from .scanner import ScanVertex
+from .spatial_index import Bounds, STRTree
+
+# Estado de cada processo do pool (PairScanner.intersections).
+workerState: Optional[tuple[Geometry, list[Segment], STRTree]] = None
+
+
+def initWorker(geo: Geometry, segments: list[Segment], tree: STRTree) -> None:
+    global workerState  # pylint: disable=global-statement
+    workerState = (geo, segments, tree)
+
+
+def findIntersections(
+    geo: Geometry, segments: list[Segment], tree: STRTree, start: int, end: int
+) -> list[tuple[int, int, Vertex]]:
+    """
+    Interseções dos segmentos start..end-1 com os candidatos de índice
+    maior. Como em Classificator.evaluateSegments, o ponto comum entre
+    extremidades dos dois segmentos (encosta) não é interseção.
+    """
+    result = []
+    for i in range(start, end):
+        first = segments[i]
+        for j in tree.query(tree.boxes[i]):
+            if j <= i:
+                continue
+            second = segments[j]
+            point = geo.intersection(first, second)
+            if point and not (
+                (geo.equalsTo(point, first.a) or geo.equalsTo(point, first.b))
+                and (geo.equalsTo(point, second.a) or geo.equalsTo(point, second.b))
+            ):
+                result.append((i, j, point))
+    return result
+
+
+def findChunk(start: int, end: int) -> list[tuple[int, int, Vertex]]:
+    assert workerState is not None
+    return findIntersections(*workerState, start, end)
+
+
+class PairScanner:
+    """
+    Alternativa à linha de varredura: os pares de segmentos candidatos vêm
+    de uma R-tree dos seus retângulos envolventes, e só eles passam por
+    Geometry.intersection. Monta os mesmos pontos de varredura (ScanVertex)
+    da varredura, com os segmentos que passam por cada ponto, para a
+    classificação de Classificator.evaluateScanPoint.
+    """
+
+    def __init__(self, geo: Geometry, segments: list[Segment], workers: int = 1):
+        self.geo = geo
+        self.segments = segments
+        self.workers = workers
+        self.points: dict[Any, list[ScanVertex]] = {}
+        self.cell = float(geo.tolerance)
+
+    def box(self, segment: Segment) -> Bounds:
+        # Retângulo com a tolerância e uma folga para o arredondamento.
+        xmin, xmax = sorted((float(segment.a.x), float(segment.b.x)))
+        ymin, ymax = sorted((float(segment.a.y), float(segment.b.y)))
+        pad = self.cell + 1e-9 * max(1.0, -xmin, xmax, -ymin, ymax)
+        return xmin - pad, ymin - pad, xmax + pad, ymax + pad
+
+    def scanPoints(self) -> list[ScanVertex]:
+        """Pontos com mais de um segmento, na ordem de x e y."""
+        for segment in self.segments:
+            self.addPoint(segment.a, segment)
+            self.addPoint(segment.b, segment)
+
+        for i, j, point in self.intersections():
+            self.addPoint(point, self.segments[i], self.segments[j])
+
+        points = [p for cell in self.points.values() for p in cell]
+        points.sort(key=lambda p: (p.vertex.x, p.vertex.y))
+        return [p for p in points if len(p.segments) > 1]
+
+    def intersections(self) -> list[tuple[int, int, Vertex]]:
+        tree = STRTree([self.box(segment) for segment in self.segments])
+        if self.workers <= 1 or len(self.segments) < 1000:
+            return findIntersections(
+                self.geo, self.segments, tree, 0, len(self.segments)
+            )
+
+        # Blocos de segmentos consultados em paralelo; cada processo recebe
+        # a árvore uma única vez e devolve os pares pelos índices.
+        size = math.ceil(len(self.segments) / (self.workers * 4))
+        starts = range(0, len(self.segments), size)
+        with ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=poolContext(),
+            initializer=initWorker,
+            initargs=(self.geo, self.segments, tree),
+        ) as pool:
+            ends = [min(start + size, len(self.segments)) for start in starts]
+            chunks = pool.map(findChunk, starts, ends)
+            return [item for chunk in chunks for item in chunk]
+
+    def key(self, vertex: Vertex) -> tuple[Any, Any]:
+        if self.cell > 0:
+            return (
+                math.floor(float(vertex.x) / self.cell),
+                math.floor(float(vertex.y) / self.cell),
+            )
+        return vertex.x, vertex.y
+
+    def addPoint(self, vertex: Vertex, *segments: Segment) -> None:
+        """Junta o segmento ao ponto igual (na tolerância) ou cria um novo."""
+        x, y = self.key(vertex)
+        cells = [(x, y)]
+        if self.cell > 0:
+            cells = [(x + i, y + j) for i in (-1, 0, 1) for j in (-1, 0, 1)]
+
+        for cell in cells:
+            for point in self.points.get(cell, ()):
+                if self.geo.equalsTo(point.vertex, vertex):
+                    for segment in segments:
+                        point.insertSegment(segment)
+                    return
+
+        point = ScanVertex(Vertex(x=vertex.x, y=vertex.y), segments[0])
+        for segment in segments[1:]:
+            point.insertSegment(segment)
+        self.points.setdefault((x, y), []).append(point)
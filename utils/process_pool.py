@@ -0,0 +1,18 @@
+import multiprocessing
+import os
+import sys
+from typing import Any
+
+
+def poolContext() -> Any:
+    """
+    Processos por fork, quando há. Com spawn (Windows), sys.executable no
+    QGIS é o próprio aplicativo: os processos usam o interpretador Python.
+    """
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    context = multiprocessing.get_context("spawn")
+    python = os.path.join(sys.exec_prefix, "python.exe")
+    if os.path.exists(python):
+        context.set_executable(python)
+    return context
@@ -0,0 +1,47 @@
+from typing import Optional
+
+from qgis.core import QgsFeedback
+
+
+class Progress:
+    """
+    Repassa ao QgsFeedback o andamento de uma etapa, mapeado para o
+    intervalo [start, end] da barra de progresso da tarefa.
+    Sem feedback, não faz nada e nunca é cancelado.
+    """
+
+    def __init__(
+        self,
+        feedback: Optional[QgsFeedback] = None,
+        start: float = 0,
+        end: float = 100,
+        total: int = 0,
+        interval: int = 1000,
+    ) -> None:
+        self.feedback = feedback
+        self.start = start
+        self.end = end
+        self.total = total
+        self.interval = interval
+        self.count = 0
+
+    def isCanceled(self) -> bool:
+        return self.feedback is not None and self.feedback.isCanceled()
+
+    def step(self) -> bool:
+        """
+        Conta um item processado e, a cada intervalo, atualiza o progresso.
+        Retorna True se a tarefa foi cancelada.
+        """
+        self.count += 1
+        if self.feedback is None or self.count % self.interval:
+            return False
+
+        if self.total > 0:
+            done = min(self.count / self.total, 1)
+            self.feedback.setProgress(self.start + (self.end - self.start) * done)
+        return bool(self.feedback.isCanceled())
+
+    def finish(self) -> None:
+        if self.feedback is not None:
+            self.feedback.setProgress(self.end)
@@ -1,6 +1,7 @@
 import functools
+import heapq
 from decimal import Decimal
-from typing import Optional
+from typing import Any, Iterator, Optional
 
 from ..models.feature import Feature
 from ..models.segment import Segment
@@ -9,6 +10,8 @@ from .geometry import Geometry
 
 
 class ScanLine:
+    __slots__ = ("vertex", "eventType", "segmentA", "segmentB")
+
     def __init__(
         self,
         vertex: Vertex,
@@ -23,6 +26,8 @@ class ScanLine:
 
 
 class ScanVertex:
+    __slots__ = ("vertex", "segments")
+
     def __init__(self, vertex: Vertex, segment: Segment) -> None:
         self.vertex = vertex
         self.segments = [segment]
@@ -56,17 +61,73 @@ class ScanVertex:
 
 
 class Scanner:
-    def __init__(self, geo: Geometry) -> None:
+    def __init__(
+        self,
+        geo: Geometry,
+        heapQueueEnabled: bool = True,
+        eventMergeEnabled: bool = False,
+        monotoneChainsEnabled: bool = False,
+    ) -> None:
         self.geo = geo
+        self.heapQueueEnabled = heapQueueEnabled
+        # Com monotoneChainsEnabled, os segmentos de cada feição são
+        # agrupados em cadeias monótonas em x (monotoneChains): no vértice
+        # entre dois segmentos da cadeia há um único evento, o fim do
+        # primeiro (tipo 1), que traz o seguinte em segmentB.
+        self.monotoneChainsEnabled = monotoneChainsEnabled
         self.lines: list[ScanLine] = []
         self.vertices: list[ScanVertex] = []
+        self.eventCount = 0
+        # Posição do próximo evento contando os dois eventos de cada
+        # segmento, com ou sem cadeias (eventKeys).
+        self.eventIndex = 0
+
+        # Com eventMergeEnabled, os eventos de extremidade não vão para
+        # self.lines: cada feição entra na fila self.streams pelo seu
+        # primeiro evento, e os demais só são gerados (e ordenados) quando a
+        # varredura chega a ele. Na fila ficam as feições ainda não
+        # iniciadas e o próximo evento de cada feição em andamento.
+        self.eventMergeEnabled = eventMergeEnabled
+        self.streams: list[Any] = []
+
+        # Fila de prioridade para os eventos de interseção (tipo 2), ordenada
+        # por scanLineComparator2. Os eventos de extremidade permanecem em
+        # self.lines, já ordenados por sortLines.
+        self.intersections: list[Any] = []
+        self.scheduledIntersections: set[tuple[tuple[int, int, int], ...]] = set()
+        self.intersectionKey = functools.cmp_to_key(self.scanLineComparator2)
 
     def next(self) -> Optional[ScanLine]:
-        result = None
-        if self.lines:
-            result = self.lines[-1]
+        endpoint = self.peekEndpoint()
+        if self.intersections and (
+            endpoint is None
+            or self.scanLineComparator2(self.intersections[0].obj, endpoint) < 0
+        ):
+            line: ScanLine = heapq.heappop(self.intersections).obj
+            return line
+
+        if endpoint is None:
+            return None
+        if self.eventMergeEnabled:
+            _, _, events = heapq.heappop(self.streams)
+            following = next(events, None)
+            if following:
+                heapq.heappush(self.streams, (*following, events))
+        else:
             self.lines.pop()
-        return result
+        return endpoint
+
+    def peekEndpoint(self) -> Optional[ScanLine]:
+        """Próximo evento de extremidade, sem retirá-lo."""
+        if not self.eventMergeEnabled:
+            return self.lines[-1] if self.lines else None
+
+        # Iniciando a feição cujo primeiro evento chegou à frente da fila.
+        while self.streams and self.streams[0][1] is None:
+            _, _, (feature, base) = heapq.heappop(self.streams)
+            events = iter(sorted(self.featureEvents(feature, base)))
+            heapq.heappush(self.streams, (*next(events), events))
+        return self.streams[0][1] if self.streams else None
 
     def nextInLine(self, scanLine: Decimal) -> Optional[ScanVertex]:
         result = None
@@ -100,23 +161,146 @@ class Scanner:
             if not feature.process:
                 continue
 
-            for segment in feature.segmentsList:
-                self.lines.append(
-                    ScanLine(
-                        vertex=Vertex(x=segment.a.x, y=segment.a.y),
-                        segmentA=segment,
-                        eventType=0,
-                    )
-                )
-                self.lines.append(
-                    ScanLine(
-                        vertex=Vertex(x=segment.b.x, y=segment.b.y),
-                        segmentA=segment,
-                        eventType=1,
-                    )
+            base = self.eventIndex
+            self.eventIndex += 2 * len(feature.segmentsList)
+            if self.eventMergeEnabled:
+                # Os eventos só são gerados em peekEndpoint; aqui basta a
+                # chave do primeiro.
+                if feature.segmentsList:
+                    self.eventCount += self.featureEventCount(feature)
+                    first = self.firstEventKey(feature, base)
+                    heapq.heappush(self.streams, (first, None, (feature, base)))
+                continue
+
+            # Os eventos referenciam os vértices do próprio segmento, que não
+            # são alterados durante a varredura.
+            lines = self.featureLines(feature)
+            self.eventCount += len(lines)
+            self.lines += lines
+
+    def featureEventCount(self, feature: Feature) -> int:
+        """Nº de eventos de featureLines, sem gerá-los."""
+        segments = feature.segmentsList
+        count = 2 * len(segments)
+        if self.monotoneChainsEnabled:
+            chains = self.monotoneChains(segments)
+            count -= sum(len(chain) - 1 for chain in chains)
+        return count
+
+    def firstEventKey(
+        self, feature: Feature, base: int
+    ) -> tuple[Any, int, Any, int]:
+        """
+        Menor chave de eventKeys da feição, sem gerar os eventos. Na grade,
+        o início (a) de um segmento vem antes do seu fim (b), e o início
+        omitido de um segmento seguinte da cadeia vem depois do início do
+        anterior: a menor chave é sempre a do início de um segmento.
+        """
+        return min(
+            (segment.a.x, 0, segment.a.y, -(base + 2 * k))
+            for k, segment in enumerate(feature.segmentsList)
+        )
+
+    def featureLines(self, feature: Feature) -> list[ScanLine]:
+        """
+        Eventos de extremidade da feição, segmento a segmento. Nas cadeias
+        monótonas, o início de cada segmento seguinte é omitido.
+        """
+        successors: dict[Segment, Segment] = {}
+        if self.monotoneChainsEnabled:
+            for chain in self.monotoneChains(feature.segmentsList):
+                successors.update(zip(chain, chain[1:]))
+        following = set(successors.values())
+
+        lines = []
+        for segment in feature.segmentsList:
+            if segment not in following:
+                lines.append(ScanLine(segment.a, eventType=0, segmentA=segment))
+            lines.append(
+                ScanLine(
+                    segment.b,
+                    eventType=1,
+                    segmentA=segment,
+                    segmentB=successors.get(segment),
                 )
+            )
+        return lines
+
+    def monotoneChains(self, segments: list[Segment]) -> list[list[Segment]]:
+        """
+        Divide os segmentos de uma feição em cadeias monótonas em x: em cada
+        cadeia, o vértice final (b) de um segmento é o inicial (a) do
+        seguinte. Os segmentos consecutivos da feição compartilham o vértice
+        comum; os verticais (na tolerância) ficam em cadeias próprias.
+        """
+        chains: list[list[Segment]] = []
+        chain: list[Segment] = []
+        direction = 0
+        for segment in segments:
+            step = 0
+            if (
+                chain
+                and self.geo.smallerThan(segment.a.x, segment.b.x)
+                and self.geo.smallerThan(chain[-1].a.x, chain[-1].b.x)
+            ):
+                if chain[-1].b is segment.a:
+                    step = 1
+                elif chain[-1].a is segment.b:
+                    step = -1
+            if step and direction in (0, step):
+                chain.append(segment)
+                direction = step
+                continue
+
+            if chain:
+                chains.append(chain[::-1] if direction < 0 else chain)
+            chain = [segment]
+            direction = 0
+
+        if chain:
+            chains.append(chain[::-1] if direction < 0 else chain)
+        return chains
+
+    def eventKeys(
+        self, lines: list[ScanLine], base: int
+    ) -> Iterator[tuple[Any, int, Any, int]]:
+        """
+        Chaves dos eventos de extremidade de uma feição (featureLines) na
+        ordem da varredura: a ordem inversa de sortOrder, com os iguais na
+        ordem inversa de addLines (base é a posição do primeiro evento da
+        feição, contando os dois eventos de cada segmento). Só é a ordem de
+        sortLines quando as comparações do núcleo geométrico são exatas
+        (GridGeometry).
+        """
+        tolerance = self.geo.tolerance
+        index = base
+        for line in lines:
+            if line.eventType == 0:
+                yield line.vertex.x, 0, line.vertex.y, -index
+            else:
+                value = line.segmentA.getSmallerX(tolerance)
+                yield line.vertex.x, 1, value, -index - 1
+                index += 2
+
+    def featureEvents(
+        self, feature: Feature, base: int
+    ) -> list[tuple[tuple[Any, int, Any, int], ScanLine]]:
+        lines = self.featureLines(feature)
+        return list(zip(self.eventKeys(lines, base), lines))
 
     def add(self, line: ScanLine) -> None:
+        # Dois segmentos se interceptam em um único ponto, portanto cada par
+        # é agendado uma única vez. Reprocessar o par desfaria a troca em
+        # Position.
+        lineId = self.intersectionId(line)
+        if lineId in self.scheduledIntersections:
+            return
+        self.scheduledIntersections.add(lineId)
+
+        if self.heapQueueEnabled:
+            heapq.heappush(self.intersections, self.intersectionKey(line))
+            return
+
         if not self.lines:
             self.lines.append(line)
             return
@@ -151,6 +335,15 @@ class Scanner:
 
         self.lines.append(line)
 
+    def intersectionId(self, line: ScanLine) -> tuple[tuple[int, int, int], ...]:
+        segments = [line.segmentA, line.segmentB or line.segmentA]
+        return tuple(
+            sorted(
+                (segment.setId, segment.featureId, segment.segmentId)
+                for segment in segments
+            )
+        )
+
     def scanLineComparator(self, scanLine: Decimal, vertex: Vertex) -> int:
         if not vertex.withinTolerance(scanLine, self.geo.tolerance):
             return -1 if self.geo.smallerThan(scanLine, vertex.x) else 1
@@ -227,7 +420,137 @@ class Scanner:
         return 1
 
     def sortLines(self) -> None:
-        self.lines.sort(key=functools.cmp_to_key(self.scanLineSorter))
+        """
+        Ordena os eventos pela chave de sortOrder, quando ela existe: nesse
+        caso, a chave e scanLineSorter dão o mesmo resultado em todas as
+        comparações, e a ordenação (estável) é idêntica. Senão, os eventos
+        são ordenados pelo próprio scanLineSorter, sem as cadeias monótonas
+        (splitChains). Sem efeito com eventMergeEnabled: os eventos já saem
+        de self.streams na ordem.
+        """
+        if self.eventMergeEnabled:
+            return
+        order = self.sortOrder()
+        if order is None:
+            self.splitChains()
+            self.lines.sort(key=functools.cmp_to_key(self.scanLineSorter))
+            return
+        self.lines = [self.lines[i] for i in order]
+
+    def splitChains(self) -> None:
+        """
+        Devolve os inícios omitidos nas cadeias monótonas, cada um logo antes
+        do fim do seu segmento, como em addLines sem cadeias.
+        """
+        following = {
+            line.segmentB
+            for line in self.lines
+            if line.eventType == 1 and line.segmentB
+        }
+        if not following:
+            return
+
+        lines = []
+        for line in self.lines:
+            if line.eventType == 1:
+                if line.segmentA in following:
+                    lines.append(ScanLine(line.segmentA.a, 0, line.segmentA))
+                line.segmentB = None
+            lines.append(line)
+        self.eventCount += len(lines) - len(self.lines)
+        self.lines = lines
+
+    def sortOrder(self) -> Optional[list[int]]:
+        """
+        Índices dos eventos na ordem de scanLineSorter: x decrescente; no
+        mesmo x, os fins (tipo 1) pelo menor x do segmento, decrescente,
+        depois os inícios (tipo 0) pelo y, decrescente. A ordenação
+        decrescente (reverse) do Python mantém a ordem original dos iguais.
+
+        Os valores iguais na tolerância (pelos próprios predicados de
+        Geometry) formam grupos, representados pelo seu maior valor. Como as
+        comparações são monótonas, dois valores estão no mesmo grupo se e só
+        se estão próximos, desde que cada grupo não se afaste do seu
+        primeiro valor; senão, a comparação de scanLineSorter não é
+        transitiva e não há chave (None).
+
+        Os inícios omitidos nas cadeias monótonas entram nos grupos, que
+        ficam os mesmos da varredura sem cadeias, e saem da ordem.
+        """
+        if any(line.eventType == 2 for line in self.lines):
+            return None
+
+        tolerance = self.geo.tolerance
+        keys = [
+            (
+                line.vertex.x,
+                line.eventType,
+                line.vertex.y
+                if line.eventType == 0
+                else line.segmentA.getSmallerX(tolerance),
+            )
+            for line in self.lines
+        ]
+        keys += [
+            (line.segmentB.a.x, 0, line.segmentB.a.y)
+            for line in self.lines
+            if line.eventType == 1 and line.segmentB
+        ]
+        indices = range(len(keys))
+        order = sorted(indices, key=keys.__getitem__, reverse=True)
+
+        # Grupos de x, e depois de y (ou de menor x) entre os eventos do
+        # mesmo tipo no mesmo x.
+        for position in (0, 2):
+            changed = self.mergeClusters(keys, order, position)
+            if changed is None:
+                return None
+            if changed:
+                order = sorted(indices, key=keys.__getitem__, reverse=True)
+        count = len(self.lines)
+        return [i for i in order if i < count]
+
+    def mergeClusters(
+        self, keys: list[tuple[Any, int, Any]], order: list[int], position: int
+    ) -> Optional[bool]:
+        """
+        Troca keys[i][position] pelo maior valor do seu grupo, percorrendo
+        order (decrescente). Na posição 2, os grupos são feitos dentro de
+        cada x e tipo. Retorna se houve troca, ou None se algum grupo for
+        mais largo que a tolerância.
+        """
+        apart = self.xApart if position == 0 else self.geo.smallerThan
+        changed = False
+        previous: Any = None
+        start: Any = None
+        for i in order:
+            key = keys[i]
+            value: Any = key[position]
+            if previous is None or (position and previous[:2] != key[:2]):
+                start = value
+            elif value != previous[position]:
+                state = apart(value, previous[position])
+                if state is None:
+                    return None
+                if state:
+                    start = value
+                elif apart(value, start) is not False:
+                    return None
+            previous = key
+            if value != start:
+                keys[i] = (
+                    (start, key[1], key[2]) if position == 0 else key[:2] + (start,)
+                )
+                changed = True
+        return changed
+
+    def xApart(self, a: Any, b: Any) -> Optional[bool]:
+        # scanLineSorter compara x com smallerThan e posEqualsTo; os dois
+        # precisam concordar.
+        smaller = self.geo.smallerThan(a, b)
+        if smaller == self.geo.posEqualsTo(a, b):
+            return None
+        return smaller
 
     def createScanPoint(
         self, vertex: Vertex, segmentA: Segment, segmentB: Optional[Segment] = None
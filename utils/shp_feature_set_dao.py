@@ -2,12 +2,13 @@ import os
 import shutil
 from decimal import Decimal
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, Callable, Optional
 
 from PyQt5.QtCore import QMetaType
 from qgis.core import (
     QgsFeature,
     QgsFeatureRequest,
+    QgsFeedback,
     QgsField,
     QgsFields,
     QgsGeometry,
@@ -15,6 +16,7 @@ from qgis.core import (
     QgsPalLayerSettings,
     QgsProject,
     QgsProperty,
+    QgsRectangle,
     QgsRuleBasedLabeling,
     QgsRuleBasedRenderer,
     QgsSimpleFillSymbolLayer,
@@ -27,7 +29,6 @@ from qgis.core import (
 )
 from qgis.PyQt.QtGui import QColor, QFont
 
-from ..models.attribute import Attribute
 from ..models.feature import Feature
 from ..models.feature_set import FeatureSet
 from ..models.new_feature_attribute import NewFeatureAttributes
@@ -35,30 +36,83 @@ from ..models.observation import Observation
 from ..models.segment import Segment
 from ..models.vertex import Vertex
 from ..params import Params
+from ..utils.feature_set_cache import FeatureSetCache, cacheKey
 from ..utils.message import Message
+from ..utils.progress import Progress
+
+WRITE_BATCH = 10000  # Feições por chamada de addFeatures.
 
 
 class SHPFeatureSetDAO:
-    def __init__(self, tolerance: Decimal = Decimal(0)) -> None:
-        self.tolerance = tolerance
+    def __init__(
+        self,
+        tolerance: Decimal = Decimal(0),
+        floatCoordinates: bool = False,
+        snapToGrid: bool = False,
+        cacheEnabled: bool = False,
+    ) -> None:
+        self.snapToGrid = snapToGrid and tolerance > 0
+        self.cacheEnabled = cacheEnabled
+        self.coordinate: Callable[[Any], Any]
+        if self.snapToGrid:
+            # Coordenadas inteiras em múltiplos da tolerância (GridGeometry).
+            self.grid = Decimal(tolerance)
+            self.coordinate = self._snap
+            self.tolerance: Any = 0
+            self.mode = f"grid:{tolerance}"
+        else:
+            # Coordenadas em float64 para o núcleo FloatGeometry.
+            self.coordinate = float if floatCoordinates else Decimal
+            self.tolerance = self.coordinate(tolerance)
+            self.mode = f"{self.coordinate.__name__}:{tolerance}"
         self.error_msg = "Feição não processada."
 
+    def is_valid_file(self, filename: str, basename: str) -> bool:
+        """Abre apenas o cabeçalho da camada, sem ler as feições."""
+        return bool(QgsVectorLayer(filename, basename, "ogr").isValid())
+
     # Tipos: 0 - bacia; 1 - limite.
     def load_feature_set(
-        self, filename: str, basename: str, shape_type: int
+        self,
+        filename: str,
+        basename: str,
+        shape_type: int,
+        progress: Optional[Progress] = None,
+        filter_rect: Optional[QgsRectangle] = None,
     ) -> Optional[FeatureSet]:
         # Lendo o registro
         layer = QgsVectorLayer(filename, basename, "ogr")
         if not layer.isValid():
             return None
 
+        # Somente as feições cujo retângulo envolvente toca filter_rect.
+        request = QgsFeatureRequest()
+        mode = self.mode
+        if filter_rect is not None:
+            request.setFilterRect(filter_rect)
+            mode += f":{filter_rect.toString(17)}"
+
+        # Reaproveitando a leitura anterior do mesmo arquivo.
+        cache = None
+        if self.cacheEnabled:
+            cache = FeatureSetCache(filename, cacheKey(filename, shape_type, mode))
+            cached = cache.load(shape_type, layer, self.coordinate)
+            if cached:
+                cached.filterRect = filter_rect
+                return cached
+
+        if progress is None:
+            progress = Progress()
+        progress.total = layer.featureCount()
+
         # Initialize variables
         obs = Observation()
         feature_set = FeatureSet(shape_type, filename, layer.wkbType(), obs, layer)
+        feature_set.filterRect = filter_rect
 
         # Montando as feições
         feature_id = 0
-        for qgs_feature in layer.getFeatures(QgsFeatureRequest()):
+        for qgs_feature in layer.getFeatures(request):
             geometry = qgs_feature.geometry()
             if geometry.isMultipart():
                 feature_id = self._parse_multi_part_feature(
@@ -66,19 +120,30 @@ class SHPFeatureSetDAO:
                     feature_set,
                     qgs_feature,
                     geometry,
-                    layer,
                     shape_type,
                     obs,
                 )
 
             else:
                 self._parse_single_part_feature(
-                    feature_id, feature_set, geometry, shape_type, obs
+                    feature_id,
+                    qgs_feature.id(),
+                    feature_set,
+                    geometry,
+                    shape_type,
+                    obs,
                 )
                 feature_id += 1
 
+            if progress.step():  # Tarefa cancelada.
+                return None
+
         # Cadastrando demais atributos da figura.
         feature_set.obs = obs
+        progress.finish()
+
+        if cache:
+            cache.save(feature_set, self.snapToGrid)
 
         return feature_set
 
@@ -88,18 +153,19 @@ class SHPFeatureSetDAO:
         feature_set: FeatureSet,
         qgs_feature: QgsFeature,
         geometry: QgsGeometry,
-        layer: QgsVectorLayer,
         shape_type: int,
         obs: Observation,
     ) -> int:
         # Lendo as partes.
         parts = self._get_raw_parts(geometry)
+        attributes: Optional[list[Any]] = None
         for part_id, rings_or_lines in enumerate(parts):
             feature = Feature(
                 geometry=QgsGeometry.fromMultiPolylineXY(rings_or_lines)
                 if isinstance(rings_or_lines[0], list)
                 else QgsGeometry.fromPolylineXY(rings_or_lines),
                 featureId=feature_id + part_id,
+                sourceId=qgs_feature.id(),
                 setId=shape_type,
                 featureType=geometry.wkbType(),
             )
@@ -123,11 +189,15 @@ class SHPFeatureSetDAO:
                 feature.hasObservation = True
                 obs.set_value(part_id, f"Parte da feição FID {feature_id + 1}.")
 
+                # Atributos lidos uma vez da feição já em mãos, nos tipos
+                # nativos, e compartilhados entre as partes.
+                if attributes is None:
+                    attributes = qgs_feature.attributes()
+
                 feature_set.newFeaturesList.append(feature)
-                feature_set.newFeaturesAttributes.append(
+                feature_set.newFeaturesAttributes[feature.featureId] = (
                     NewFeatureAttributes(
-                        featureId=feature_id + part_id,
-                        attributes=self.read_attributes(layer, qgs_feature.id()),
+                        featureId=feature.featureId, attributes=attributes
                     )
                 )
 
@@ -143,23 +213,32 @@ class SHPFeatureSetDAO:
             return list(geometry.asMultiPolygon())
         return list(geometry.asPolyline())
 
+    def _snap(self, value: float) -> int:
+        return round(Decimal(value) / self.grid)
+
     def _parse_vertices(self, rings_or_lines: list[Any]) -> list[Vertex]:
-        vertex_list = []
+        vertex_list: list[Vertex] = []
         vertex_id = 0
         for i, ring_or_line in enumerate(rings_or_lines):
             if not isinstance(ring_or_line, list):
                 ring_or_line = [ring_or_line]
 
             for j, point in enumerate(ring_or_line):
-                vertex_list.append(
-                    Vertex(
-                        vertexId=vertex_id,
-                        x=Decimal(point.x()),
-                        y=Decimal(point.y()),
-                        last=i == len(rings_or_lines) - 1
-                        and j == len(ring_or_line) - 1,
-                    )
-                )
+                x = self.coordinate(point.x())
+                y = self.coordinate(point.y())
+                last = i == len(rings_or_lines) - 1 and j == len(ring_or_line) - 1
+
+                # Vértices consecutivos na mesma célula da grade são unificados.
+                if (
+                    self.snapToGrid
+                    and vertex_list
+                    and vertex_list[-1].x == x
+                    and vertex_list[-1].y == y
+                ):
+                    vertex_list[-1].last = last
+                    continue
+
+                vertex_list.append(Vertex(vertexId=vertex_id, x=x, y=y, last=last))
                 vertex_id += 1
         return vertex_list
 
@@ -173,7 +252,7 @@ class SHPFeatureSetDAO:
 
             # Determine the correct orientation
             if vertex_A.x + self.tolerance < vertex_B.x or (
-                abs(vertex_A.x - vertex_B.x) < self.tolerance
+                abs(vertex_A.x - vertex_B.x) <= self.tolerance
                 and vertex_A.y + self.tolerance < vertex_B.y
             ):
                 start, end = vertex_A, vertex_B
@@ -195,13 +274,17 @@ class SHPFeatureSetDAO:
     def _parse_single_part_feature(
         self,
         feature_id: int,
+        source_id: int,
         feature_set: FeatureSet,
         geometry: QgsGeometry,
         shape_type: int,
         obs: Observation,
     ) -> None:
         vertex_list = (
-            [Vertex(x=point.x(), y=point.y()) for point in geometry.asPolyline()]
+            [
+                Vertex(x=self.coordinate(point.x()), y=self.coordinate(point.y()))
+                for point in geometry.asPolyline()
+            ]
             if not geometry.isNull()
             else []
         )
@@ -209,6 +292,7 @@ class SHPFeatureSetDAO:
             feature = Feature(
                 geometry,
                 featureId=feature_id,
+                sourceId=source_id,
                 setId=shape_type,
                 featureType=geometry.wkbType(),
                 vertexList=vertex_list,
@@ -233,6 +317,7 @@ class SHPFeatureSetDAO:
             feature = Feature(
                 geometry,
                 featureId=feature_id,
+                sourceId=source_id,
                 setId=shape_type,
                 featureType=geometry.wkbType(),
                 vertexList=vertex_list,
@@ -244,38 +329,6 @@ class SHPFeatureSetDAO:
 
         feature_set.featuresList.append(feature)
 
-    # Function to read attributes from a QgsVectorLayer feature
-    def read_attributes(
-        self, layer: QgsVectorLayer, feature_id: int
-    ) -> list[Attribute]:
-        feature = next(layer.getFeatures(QgsFeatureRequest(feature_id)))
-        attributes = []
-
-        for field in layer.fields():
-            field_name = field.name()
-            field_type = field.type()
-            value = feature[field_name]
-
-            # Convert to string
-            if field_type == QMetaType.Type.QString:
-                value = str(value)
-            elif field_type == QMetaType.Type.Int:
-                value = str(int(value))
-            elif field_type == QMetaType.Type.Double:
-                value = str(Decimal(value))
-            elif field_type == QMetaType.Type.Bool:
-                value = str(bool(value))
-            elif field_type == QMetaType.Type.QDate:
-                value = value.toString("yyyy-MM-dd")
-
-            attributes.append(
-                Attribute(
-                    attr_name=field_name, attr_type=field_type, attr_value=value
-                )
-            )
-
-        return attributes
-
     def create_feature_set(
         self,
         new_filename: str,
@@ -321,6 +374,9 @@ class SHPFeatureSetDAO:
 
         fields.append(QgsField("Sharp", QMetaType.Type.Double))
 
+        if params.basinPartitionEnabled:
+            fields.append(QgsField("Bacia", QMetaType.Type.Int))
+
         if has_observation:
             obs_field_name = "Obs:"
             fields.append(QgsField(obs_field_name, QMetaType.Type.QString, len=80))
@@ -331,12 +387,10 @@ class SHPFeatureSetDAO:
         self,
         featureId: int,
         feature: Feature,
-        qgs_feature: QgsFeature,
-        writer: QgsVectorFileWriter,
+        attributes: list[Any],
         fields: QgsFields,
         params: Params,
-        attributes: Optional[list[Attribute]],
-    ) -> None:
+    ) -> QgsFeature:
         # Create a new feature
         copy = QgsFeature(fields, featureId)
 
@@ -344,12 +398,8 @@ class SHPFeatureSetDAO:
         copy.setGeometry(self._check_geometry_flow(feature))
 
         # Set the attributes
-        if attributes and len(attributes) > 0:
-            for i, attr in enumerate(attributes):
-                copy.setAttribute(i, attr.attr_value)
-        else:
-            for i, attribute in enumerate(qgs_feature.attributes()):
-                copy.setAttribute(i, attribute)
+        for i, value in enumerate(attributes):
+            copy.setAttribute(i, value)
 
         copy.setAttribute("FID", featureId + 1)
 
@@ -366,7 +416,10 @@ class SHPFeatureSetDAO:
         if params.monitorPointEnabled:
             copy.setAttribute("Sharp", feature.sharp)
 
-        writer.addFeature(copy)
+        if params.basinPartitionEnabled:
+            copy.setAttribute("Bacia", feature.basinId)
+
+        return copy
 
     def _check_geometry_flow(self, feature: Feature) -> QgsGeometry:
         if feature.flow == 2:
@@ -381,8 +434,21 @@ class SHPFeatureSetDAO:
         return feature.geometry
 
     def save_feature_set(
-        self, feature_set: FeatureSet, params: Params, log: Message
-    ) -> None:
+        self,
+        feature_set: FeatureSet,
+        params: Params,
+        log: Message,
+        feedback: Optional[QgsFeedback] = None,
+    ) -> bool:
+        """
+        Grava a bacia classificada em params.newFileName. Retorna False se o
+        arquivo não pôde ser criado ou se a tarefa foi cancelada.
+        """
+        progress = Progress(
+            feedback,
+            total=len(feature_set.featuresList) + len(feature_set.newFeaturesList),
+            interval=100,
+        )
         fields = self.get_fields(
             feature_set.raw, params, len(feature_set.obs.list) > 0
         )
@@ -391,40 +457,74 @@ class SHPFeatureSetDAO:
             params.newFileName, feature_set.raw, fields, log
         )
         if not writer:
-            return
-
-        # Gravando os registros já existentes no shapefile original.
-        featureCount = 0
-        for feature in feature_set.featuresList:
-            self.copy_feature(
-                featureCount,
-                feature,
-                feature_set.raw.getFeature(feature.featureId),
-                writer,
-                fields,
-                params,
-                None,
+            return False
+
+        # Gravando os registros já existentes no shapefile original. O arquivo
+        # de origem é lido uma vez, em ordem, e cada feição encontra a sua
+        # classificação pelo FID de origem.
+        index = {
+            feature.sourceId: position
+            for position, feature in enumerate(feature_set.featuresList)
+        }
+        request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry)
+        if feature_set.filterRect is not None:
+            request.setFilterRect(feature_set.filterRect)
+        batch: list[QgsFeature] = []
+        for qgs_feature in feature_set.raw.getFeatures(request):
+            position = index.get(qgs_feature.id())
+            if position is None:
+                continue
+
+            batch.append(
+                self.copy_feature(
+                    position,
+                    feature_set.featuresList[position],
+                    qgs_feature.attributes(),
+                    fields,
+                    params,
+                )
             )
-            featureCount += 1
+            if len(batch) >= WRITE_BATCH:
+                writer.addFeatures(batch)
+                batch.clear()
+
+            if progress.step():  # Tarefa cancelada.
+                del writer
+                return False
 
         # Gravando os novos registros criados.
+        featureCount = len(feature_set.featuresList)
         for new_feature in feature_set.newFeaturesList:
-            self.copy_feature(
-                featureCount,
-                new_feature,
-                feature_set.raw.getFeature(new_feature.featureId),
-                writer,
-                fields,
-                params,
-                feature_set.getNewFeatureAttributes(new_feature.featureId),
+            batch.append(
+                self.copy_feature(
+                    featureCount,
+                    new_feature,
+                    feature_set.getNewFeatureAttributes(new_feature.featureId) or [],
+                    fields,
+                    params,
+                )
             )
             featureCount += 1
+            if len(batch) >= WRITE_BATCH:
+                writer.addFeatures(batch)
+                batch.clear()
+
+            if progress.step():  # Tarefa cancelada.
+                del writer
+                return False
+
+        if batch:
+            writer.addFeatures(batch)
 
         del writer
 
         # Copiando os arquivos de configuração.
         self._copy_config_files(params.drainageFileName, params.newFileName)
+        progress.finish()
+        return True
 
+    def add_result_layer(self, params: Params) -> None:
+        """Adiciona o arquivo gravado ao projeto (thread da interface)."""
         new_layer = QgsVectorLayer(params.newFileName, "Hydroflow Results", "ogr")
         self._set_layer_style(new_layer)
 
@@ -0,0 +1,109 @@
+import math
+from typing import Any, Iterable
+
+Bounds = tuple[float, float, float, float]  # xmin, ymin, xmax, ymax
+
+
+def bounds(points: Iterable[tuple[Any, Any]]) -> Bounds:
+    xs, ys = [], []
+    for x, y in points:
+        xs.append(float(x))
+        ys.append(float(y))
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def overlaps(a: Bounds, b: Bounds) -> bool:
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+class GridIndex:
+    """
+    Índice espacial de retângulos envolventes em uma grade uniforme: cada
+    item é registrado nas células que o seu retângulo cobre, e a consulta
+    só examina os itens das células tocadas.
+    """
+
+    def __init__(self, cellSize: float) -> None:
+        self.cellSize = cellSize if cellSize > 0 else 1.0
+        self.cells: dict[tuple[int, int], list[int]] = {}
+        self.items: dict[int, Bounds] = {}
+
+    def _range(self, box: Bounds) -> tuple[range, range]:
+        xmin, ymin, xmax, ymax = (math.floor(v / self.cellSize) for v in box)
+        return range(xmin, xmax + 1), range(ymin, ymax + 1)
+
+    def insert(self, itemId: int, box: Bounds) -> None:
+        self.items[itemId] = box
+        columns, rows = self._range(box)
+        for i in columns:
+            for j in rows:
+                self.cells.setdefault((i, j), []).append(itemId)
+
+    def query(self, box: Bounds) -> list[int]:
+        """Itens cujo retângulo toca box, em ordem de inserção."""
+        found: set[int] = set()
+        columns, rows = self._range(box)
+        for i in columns:
+            for j in rows:
+                for itemId in self.cells.get((i, j), ()):
+                    if overlaps(self.items[itemId], box):
+                        found.add(itemId)
+        return sorted(found)
+
+    def queryPoint(self, x: float, y: float) -> list[int]:
+        return self.query((x, y, x, y))
+
+
+class STRTree:
+    """
+    R-tree estática empacotada por Sort-Tile-Recursive: os retângulos são
+    ordenados pelo centro em x, fatiados em faixas, ordenados em y dentro
+    de cada faixa e agrupados em nós de capacity itens, nível a nível.
+    """
+
+    def __init__(self, boxes: list[Bounds], capacity: int = 16) -> None:
+        self.boxes = boxes
+        self.capacity = capacity
+        # Nó: (retângulo, filhos, folha). Nas folhas, os filhos são os
+        # índices dos retângulos em boxes.
+        level: list[tuple[Bounds, Any, bool]] = self._pack(
+            [(box, i, True) for i, box in enumerate(boxes)], True
+        )
+        while len(level) > 1:
+            level = self._pack(level, False)
+        self.root = level[0] if level else None
+
+    def _pack(
+        self, entries: list[tuple[Bounds, Any, bool]], leaf: bool
+    ) -> list[tuple[Bounds, Any, bool]]:
+        size = self.capacity
+        step = size * math.ceil(math.sqrt(math.ceil(len(entries) / size)))
+        entries = sorted(entries, key=lambda e: e[0][0] + e[0][2])
+        nodes = []
+        for i in range(0, len(entries), step):
+            tile = sorted(entries[i : i + step], key=lambda e: e[0][1] + e[0][3])
+            for j in range(0, len(tile), size):
+                group = tile[j : j + size]
+                box = (
+                    min(e[0][0] for e in group),
+                    min(e[0][1] for e in group),
+                    max(e[0][2] for e in group),
+                    max(e[0][3] for e in group),
+                )
+                children = [e[1] for e in group] if leaf else group
+                nodes.append((box, children, leaf))
+        return nodes
+
+    def query(self, box: Bounds) -> list[int]:
+        """Índices dos retângulos que tocam box, em ordem crescente."""
+        found: list[int] = []
+        stack = [self.root] if self.root else []
+        while stack:
+            nodeBox, children, leaf = stack.pop()
+            if not overlaps(nodeBox, box):
+                continue
+            if leaf:
+                found += [i for i in children if overlaps(self.boxes[i], box)]
+            else:
+                stack += children
+        return sorted(found)